@@ -24,6 +24,8 @@ class simucurve(Curve.curve):
         return discount factor, for all simulation paths of current simulation time step
     get_forward_rate(start_date, end_date) :
         return forward rate, for all simulation paths of current simulation time step
+    get_forward_rate_yf(start_yf, end_yf) :
+        same as get_forward_rate, dates given as year frac from val_date
     __init__(name, val_date, tenors) :
         initiate interest rate curve
     '''
@@ -59,12 +61,17 @@ class simucurve(Curve.curve):
 
 
     def get_forward_rate(self, start_date, end_date):
-        if (start_date - self.val_date).days / 365. < self.hw_model.get_current_simu_date() or end_date <= start_date:
+        val_day = np.datetime64(self.val_date, 'D')
+        start_day = (np.datetime64(start_date, 'D') - val_day).astype(np.int64)
+        end_day = (np.datetime64(end_date, 'D') - val_day).astype(np.int64)
+        return self.get_forward_rate_yf(start_day / 365., end_day / 365.)
+
+    def get_forward_rate_yf(self, start_yf, end_yf):
+        if start_yf < self.hw_model.get_current_simu_date() or end_yf <= start_yf:
             raise ValueError('forward rate start date or end date is not valid')
-        df_start = self.get_discount_factor((start_date - self.val_date).days/365)
-        df_end = self.get_discount_factor((end_date - self.val_date).days/365)
-        year_frac = (end_date - start_date).days/365
-        return (df_start / df_end - 1) / year_frac
+        df_start = self.get_discount_factor(start_yf)
+        df_end = self.get_discount_factor(end_yf)
+        return (df_start / df_end - 1) / (end_yf - start_yf)
 
     def get_currency(self):
         return self.name[:3]
@@ -0,0 +1,153 @@
+"""
+Name:   Calibration benchmark
+Description: timing, evaluation count, peak memory and residual of the shipped USD/JPY calibration sets,
+             results written to json and compared against a previous run
+Created:     2026
+"""
+
+import Calibration
+import Curve
+import numpy as np
+import pandas as pd
+import datetime as dt
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+# calibration sets in run order, parent curves are taken in memory from the sets calibrated before
+BENCHMARK_SETS = [{'name': 'USD OIS+3M', 'input file': 'USD_calibration.csv',
+                   'curves': ['USD.OIS', 'USD.LIBOR.3M'], 'input curves': []},
+                  {'name': 'USD 6M', 'input file': 'USD_calibration.csv',
+                   'curves': ['USD.LIBOR.6M'], 'input curves': ['USD.OIS', 'USD.LIBOR.3M']},
+                  {'name': 'JPY TONAR+3M+6M', 'input file': 'JPY_calibration.csv',
+                   'curves': ['JPY.TONAR', 'JPY.LIBOR.3M', 'JPY.LIBOR.6M'], 'input curves': []},
+                  {'name': 'JPY 6M', 'input file': 'JPY_calibration.csv',
+                   'curves': ['JPY.LIBOR.6M'], 'input curves': ['JPY.TONAR', 'JPY.LIBOR.3M']}]
+
+# deterministic metrics, any increase over the baseline is a regression
+COUNT_METRICS = ['nfev', 'njev']
+# metrics with small run to run noise, relative increase above threshold is a regression
+MEMORY_METRICS = ['peak memory']
+# timings of a few ms, only checked on request, relative increase above threshold and above time_floor
+TIMING_METRICS = ['setup time', 'solve time']
+
+CALIBRATION_METHODS = ['levmar', 'bootstrap', 'trf']
+
+def run_calibration_set(val_date, benchmark_set, parent_curves, method='levmar'):
+    '''
+    :param parent_curves: dict<curve_name, curve>, calibrated curves of the previous sets
+    :return: curveconstructor, calibrationreport, setup time (input read, parent curves and curveconstructor
+             construction), solve time
+    '''
+    start = time.perf_counter()
+    curves_info_dict = {}
+    Calibration.read_curves_info(benchmark_set['input file'], curves_info_dict)
+    input_curves_dict = {}
+    for name in benchmark_set['input curves']:
+        curve = parent_curves[name]
+        input_curves_dict[name] = Curve.curve(name, val_date, curve.x, curve.y, interp_scheme=curve.interp_scheme)
+    curves_to_calibrate = {}
+    for name in benchmark_set['curves']:
+        curves_to_calibrate[name] = pd.DataFrame()
+    read_time = time.perf_counter() - start
+    curve_constructor, report = Calibration.solve_curves(val_date, curves_info_dict, curves_to_calibrate,
+                                                         input_curves_dict, method=method, verbose=False)
+    return curve_constructor, report, read_time + report.construction_time, report.solver_time
+
+def run_benchmark(val_date, repeat=10, method='levmar', output_file_pathname=''):
+    '''
+    run every set repeat times, min setup and solve time kept, then once more under tracemalloc for peak memory
+    :param output_file_pathname: if not empty, results are written to this json file
+    :return: dict<set name, dict<metric, value>>
+    '''
+    results = {}
+    parent_curves = {}
+    for benchmark_set in BENCHMARK_SETS:
+        setup_times = []
+        solve_times = []
+        for i in range(repeat):
+            curve_constructor, report, setup_time, solve_time = run_calibration_set(val_date, benchmark_set,
+                                                                                     parent_curves, method)
+            setup_times.append(setup_time)
+            solve_times.append(solve_time)
+        # peak memory in a separate run, tracemalloc slows down allocations
+        tracemalloc.start()
+        run_calibration_set(val_date, benchmark_set, parent_curves, method)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        parent_curves.update(curve_constructor.curves_to_calibrate)
+        residuals = np.array([row['residual'] for row in report.residuals])
+        results[benchmark_set['name']] = {'setup time': min(setup_times),
+                                          'solve time': min(solve_times),
+                                          'nfev': report.nfev,
+                                          'njev': report.njev,
+                                          'peak memory': peak,
+                                          'residual norm': float(np.linalg.norm(residuals)),
+                                          'max abs residual': report.max_abs_residual,
+                                          'exit code': report.exit_code}
+    if output_file_pathname:
+        with open(output_file_pathname, 'w') as f:
+            json.dump({'val date': val_date.strftime('%Y-%m-%d'), 'method': method, 'repeat': repeat,
+                       'results': results}, f, indent=1)
+    return results
+
+def compare_benchmark(results, baseline_file_pathname, threshold=0.2, residual_tol=1e-10, check_timing=False,
+                      time_floor=0.005, method='levmar'):
+    '''
+    :param baseline_file_pathname: json file written by run_benchmark, with the same calibration method
+    :param threshold: allowed relative increase of MEMORY_METRICS, and of TIMING_METRICS if check_timing
+    :param check_timing: if True, setup and solve time are compared as well, off by default since timings of
+                         a few ms vary by more than threshold between identical runs
+    :param time_floor: seconds, timing increases below time_floor are ignored as noise
+    :return: list of (set name, metric, baseline, new) regressions, residual norm above residual_tol included
+    '''
+    with open(baseline_file_pathname) as f:
+        baseline_file = json.load(f)
+    if baseline_file['method'] != method:
+        raise ValueError(baseline_file_pathname, 'is a', baseline_file['method'], 'benchmark, not', method)
+    baseline = baseline_file['results']
+    regressions = []
+    for name, metrics in results.items():
+        if metrics['residual norm'] > residual_tol:
+            regressions.append((name, 'residual norm', residual_tol, metrics['residual norm']))
+        if name not in baseline:
+            continue
+        for metric in COUNT_METRICS:
+            if metrics[metric] > baseline[name][metric]:
+                regressions.append((name, metric, baseline[name][metric], metrics[metric]))
+        for metric in MEMORY_METRICS:
+            if metrics[metric] > baseline[name][metric] * (1 + threshold):
+                regressions.append((name, metric, baseline[name][metric], metrics[metric]))
+        if not check_timing:
+            continue
+        for metric in TIMING_METRICS:
+            if (metrics[metric] > baseline[name][metric] * (1 + threshold)
+                    and metrics[metric] - baseline[name][metric] > time_floor):
+                regressions.append((name, metric, baseline[name][metric], metrics[metric]))
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='calibration benchmark on the USD/JPY calibration sets')
+    parser.add_argument('output', nargs='?', default='benchmark_results.json', help='result json file')
+    parser.add_argument('--baseline', default='', help='baseline json file, exit code 1 on regression')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative increase')
+    parser.add_argument('--repeat', type=int, default=10, help='runs per set, min time is kept')
+    parser.add_argument('--method', default='levmar', choices=CALIBRATION_METHODS, help='calibration method')
+    parser.add_argument('--check-timing', action='store_true', help='also gate on setup and solve time')
+    parser.add_argument('--time-floor', type=float, default=0.005, help='ignored timing increase, seconds')
+    args = parser.parse_args()
+    val_date = dt.datetime(year=2020, month=1, day=2)
+    results = run_benchmark(val_date, args.repeat, args.method, args.output)
+    for name, metrics in results.items():
+        print(name, 'setup time', metrics['setup time'], 'solve time', metrics['solve time'],
+              'nfev', metrics['nfev'], 'peak memory', metrics['peak memory'],
+              'residual norm', metrics['residual norm'])
+    if args.baseline:
+        regressions = compare_benchmark(results, args.baseline, args.threshold, check_timing=args.check_timing,
+                                        time_floor=args.time_floor, method=args.method)
+        for name, metric, base, new in regressions:
+            print('regression', name, metric, 'baseline', base, 'new', new)
+        if regressions:
+            sys.exit(1)
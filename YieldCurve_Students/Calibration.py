@@ -13,10 +13,125 @@ import Swap
 import FRA
 import FXForward
 import Curve
-from scipy.optimize import leastsq
+import PricingProgram
+import CurveCube
+from scipy.optimize import leastsq, least_squares
+from scipy.linalg import lu_factor, lu_solve
 import time
+import os
+import io
+import concurrent.futures
+import json
 import pdb
 
+# curve columns read by curveconstructor when assigning curves, per instrument type
+INSTRUMENT_CURVE_COLUMNS = {'fedfund future': ['ForwardCurve'],
+                            'future': ['ForwardCurve'],
+                            'swap': ['DiscountCurve', 'Leg2 ForwardCurve'],
+                            'basis swap': ['DiscountCurve', 'Leg2 ForwardCurve', 'ForwardCurve'],
+                            'fra': ['ForwardCurve'],
+                            'fx forward': ['DiscountCurve', 'Leg2 DiscountCurve']}
+
+# curve store arrays by file path, reloaded when the file modification time or size changes,
+# at most CURVE_STORE_CACHE_SIZE stores are kept, the oldest is dropped first
+CURVE_STORE_CACHE = {}
+CURVE_STORE_CACHE_SIZE = 16
+
+class calibrationreport(object):
+    '''
+    calibration telemetry, filled by the solver callbacks and solve_curves
+    Attributes
+    ==========
+    method : string, calibration method
+    curve_names : list<string>, calibrated curves
+    nfev, njev : int, objective and jacobian evaluations
+    update_time, compute_target_time, jacobian_time : double, seconds spent in
+        update_curve_yvectors, compute_target and compute_jacobian
+    construction_time, bootstrap_time, solver_time : double, seconds, construction_time is spent building the
+        curveconstructor (instruments, schedules, pricing program)
+    norm_history : list<double>, residual norm of every objective evaluation
+    iteration_norms : list<double>, residual norm at each jacobian evaluation, i.e. each accepted iterate
+    finite_difference : bool, if True the solver builds the jacobian from objective evaluations, iterates are
+        detected from the evaluation points, an evaluation followed by evaluations moving only some of its
+        coordinates (the finite difference steps) is an accepted iterate
+    exit_code, message : solver exit code (leastsq ier, least_squares status) and message,
+        exit_code is None if the bootstrap converged without solver fallback
+    residuals : list<dict>, per instrument curve, instrument, type, tenor, target, computed target, residual
+    max_abs_residual : double
+
+    Methods
+    =======
+    record_evaluation(update_time, compute_target_time, errors, yvalues) :
+        record one objective evaluation
+    record_jacobian(update_time, jacobian_time) :
+        record one jacobian evaluation
+    is_converged(tol) :
+        return True if every instrument residual is below tol
+    to_dict() / save_json(file_path_name) :
+        export report
+    '''
+
+    def __init__(self, method='levmar', curve_names=None):
+        self.method = method
+        self.curve_names = list(curve_names) if curve_names is not None else []
+        self.nfev = 0
+        self.njev = 0
+        self.update_time = 0.
+        self.compute_target_time = 0.
+        self.jacobian_time = 0.
+        self.construction_time = 0.
+        self.bootstrap_time = 0.
+        self.solver_time = 0.
+        self.norm_history = []
+        self.iteration_norms = []
+        self.finite_difference = False
+        # last evaluation point that is not a finite difference step, with its norm and whether it is recorded
+        self._iterate = None
+        self._iterate_norm = np.nan
+        self._iterate_recorded = False
+        self.exit_code = None
+        self.message = ''
+        self.residuals = []
+        self.max_abs_residual = np.nan
+
+    def record_evaluation(self, update_time, compute_target_time, errors, yvalues=None):
+        self.nfev += 1
+        self.update_time += update_time
+        self.compute_target_time += compute_target_time
+        self.norm_history.append(float(np.linalg.norm(errors)))
+        if self.finite_difference and yvalues is not None:
+            self.__record_iterate(np.array(yvalues, dtype=float))
+
+    def __record_iterate(self, yvalues):
+        # finite difference steps move some coordinates of the iterate, trial steps move all of them
+        if self._iterate is not None:
+            moved = np.count_nonzero(yvalues != self._iterate)
+            if 0 < moved < yvalues.shape[0]:
+                if not self._iterate_recorded:
+                    self.iteration_norms.append(self._iterate_norm)
+                    self._iterate_recorded = True
+                return
+        self._iterate = yvalues
+        self._iterate_norm = self.norm_history[-1]
+        self._iterate_recorded = False
+
+    def record_jacobian(self, update_time, jacobian_time):
+        self.njev += 1
+        self.update_time += update_time
+        self.jacobian_time += jacobian_time
+        if self.norm_history:
+            self.iteration_norms.append(self.norm_history[-1])
+
+    def is_converged(self, tol=1e-10):
+        return bool(self.max_abs_residual < tol)
+
+    def to_dict(self):
+        return dict((key, value) for key, value in self.__dict__.items() if not key.startswith('_'))
+
+    def save_json(self, file_path_name):
+        with open(file_path_name, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
+
 class curveconstructor(object):
     '''
     curve calibration class
@@ -27,6 +142,10 @@ class curveconstructor(object):
     curve_dict : all curves need in curve instrumetns pricing dict<curve_name, curve>
                     e.g., to calibrate USD.LIBOR6M, we need USD.OIS, USD.LIBOR.3M curves
     curve_calibration_dict : curves for calibration, dict<curve_name, curve>
+    curves_info_dict : dict<curve_name, dataframe>, copies of the input instrument frames of the curves to calibrate,
+                       set_market_quotes and save_calibration_results write to the copies, not to the caller's frames
+    interp_schemes : interpolation scheme per curve to calibrate, dict<curve_name, scheme>, default 'linear'
+    jacobian_cache : dict<tuple<curve_name>, lu factors>, block jacobians reused by recalibrate
 
     Methods
     =======
@@ -34,18 +153,46 @@ class curveconstructor(object):
         update curves with new iterated curve yiled values, follow order of curve_calibration_dict
     compute_errors():
         return error in array, computed targets - targets
-    __init__(curves_info_dict, curves_to_calibrate)
+    compute_jacobian(keys):
+        return d computed targets / d curve y vectors, rows follow targets, columns follow update_curve_yvectors
+        keys : optional curve names, restrict update/targets/jacobian to a block of curves
+    compute_jacobian_sparsity(keys):
+        return bool pattern of compute_jacobian from instrument curves and maturities, without pricing
+    get_curve_dependencies():
+        return calibrated curves each curve's instruments depend on
+    bootstrap(tol, max_iterations, max_sweeps, flat_start):
+        sequential pillar by pillar calibration, return curves not converged
+    get_initial_yvectors(initial_curves, pillar_tol):
+        return solver start from previous curves matched by name and pillar, zeros for new pillars
+    get_residuals():
+        return per instrument residuals at the current curves
+    get_leg_pv_stats():
+        return swap leg evaluations and skipped (unchanged curves) evaluations, summed over instruments
+    compile_pricing():
+        flatten all instruments into PricingProgram.pricingprogram, used by compute_target and compute_jacobian
+    set_market_quotes(quotes):
+        reset instrument quotes and targets, return curves whose targets changed
+    recalibrate(quotes, changed_curves, tol, max_iterations):
+        incremental calibration of the curves affected by quote changes and of their dependents
+    __init__(curves_info_dict, curves_to_calibrate, input_curves_dict, interp_schemes, compile_pricing)
     '''
 
-    def __init__(self, val_date, curves_info_dict, curves_to_calibrate, input_curves_dict={}):
+    def __init__(self, val_date, curves_info_dict, curves_to_calibrate, input_curves_dict={}, interp_schemes={},
+                 compile_pricing=True):
         # step1 initiate curve instruments self.curve_instruments_dict
         # step2 initiate curves to calibrate, curves_to_calibrate, curve initial value is from market quote
         # step3 initiate targets for all curves to be calibrated
         self.version = 0
+        # calibrationreport filled by the solver callbacks, None outside solve_curves
+        self.report = None
         self.curve_instruments_dict = {}
         self.curves_to_calibrate = curves_to_calibrate
         self.input_curves_dict = input_curves_dict
-        self.curves_info_dict = curves_info_dict
+        self.curves_info_dict = {}
+        for key in curves_to_calibrate:
+            if key in curves_info_dict:
+                self.curves_info_dict[key] = curves_info_dict[key].copy()
+        self.interp_schemes = interp_schemes
         self.targets = []
         for key in curves_to_calibrate:
             try:
@@ -56,37 +203,31 @@ class curveconstructor(object):
             x = np.zeros(curve_df.shape[0])
             y = np.zeros(curve_df.shape[0])
             for index, row in curve_df.iterrows():
-                target = 0.
                 if row['Type'].lower() == 'fedfund future':
                     instruments.append(Future.future(val_date, row['Start Tenor'], row['Tenor'],
                                                      True, row['Market Quote']))
-                    target = (100 - row['Market Quote'])/100
                 elif row['Type'].lower() == 'future':
                     instruments.append(Future.future(val_date, row['Start Tenor'], row['Tenor'],
                                                      False, row['Market Quote']))
-                    target = (100 - row['Market Quote']) / 100
                 elif row['Type'].lower() == 'swap':
                     instruments.append(Swap.swap(val_date, row['Tenor'], row['Leg1 Freq'], row['Leg2 Freq'],
                                                  False, row['Market Quote']))
-                    target = row['Market Quote']
                 elif row['Type'].lower() == 'basis swap':
                     instruments.append(Swap.swap(val_date, row['Tenor'], row['Leg1 Freq'], row['Leg2 Freq'],
                                                  True, row['Market Quote']))
-                    target = row['Market Quote']
                 elif row['Type'].lower() == 'fra':
                     instruments.append(FRA.fra(val_date, row['Start Tenor'], row['Tenor'], row['Market Quote']))
-                    target = row['Market Quote']
                 elif row['Type'].lower() == 'fx forward':
                     instruments.append(FXForward.fxforward(val_date, row['Tenor'], 108., row['Market Quote']))
-                    target = instruments[-1].convert_marketquote_to_target()
                 else:
                     raise AttributeError('only 7 type instruments are implemented: '
                                          'fedfund fture, future, swap, basis swap,'
                                          'fra, fx forward, mtmxccy basis swap')
                 x[index] = instruments[-1].get_maturity()
                 y[index] = 0.
-                self.targets.append(target)
-            self.curves_to_calibrate[key] = Curve.curve(key, val_date, x, y)
+                self.targets.append(self.__market_quote_to_target(instruments[-1], row['Market Quote']))
+            self.curves_to_calibrate[key] = Curve.curve(key, val_date, x, y,
+                                                        interp_scheme=interp_schemes.get(key, 'linear'))
             self.curve_instruments_dict[key] = instruments
         # step4 sanity check, sum of curve y vector size must be equal to targets size
         self.targets = np.array(self.targets)
@@ -97,174 +238,546 @@ class curveconstructor(object):
             raise ValueError("number of targets is not equal to the total number of curve size")
         # step5 assign curves to curve instruments
         self.__assign_curves()
+        # step6 compile instruments into one pricing program, instrument by instrument pricing otherwise
+        self.pricing_program = None
+        if compile_pricing:
+            self.compile_pricing()
+        # lu factors of the block jacobians used by recalibrate, keyed by block curve names
+        self.jacobian_cache = {}
+        self.curve_graph = None
 
     def __assign_curves(self):
         '''
         Assign curves to each instrument, e.g., fedfund/libor basis swap, we assign 3 curves for this instrument
         curves are passed by reference, e.g., only 1 instance of ois curve, shared by all instruments
         in this way as long as we update the curve, all instruments will be refreshed as well
+        curve names are read once per curve and instrument type group, from the first row of the group
         :return:
         '''
+        # curve name -> curve object, curves to calibrate take precedence over input curves
+        self.curve_map = dict(self.input_curves_dict)
+        self.curve_map.update(self.curves_to_calibrate)
         for key, value in self.curve_instruments_dict.items():
+            curve_df = self.curves_info_dict[key]
+            group_rows = {}
+            for group, array in (('future', ['future', 'fedfund future']), ('swap', ['swap', 'basis swap']),
+                                 ('fra', ['FRA']), ('fx forward', ['fx forward'])):
+                rows = curve_df.loc[curve_df['Type'].isin(array)]
+                if rows.shape[0] > 0:
+                    group_rows[group] = rows.iloc[0]
             for instrument in value:
                 if isinstance(instrument, Future.future):
-                    array = ['future', 'fedfund future']
-                    curve_name = self.curves_info_dict[key].loc[self.curves_info_dict[key]['Type'].isin(array)]\
-                        ['ForwardCurve'].iloc[0]
-                    if curve_name in self.curves_to_calibrate:
-                        instrument.forward_curve = self.curves_to_calibrate[curve_name]
-                    elif curve_name in self.input_curves_dict:
-                        instrument.forward_curve = self.input_curves_dict[curve_name]
-                    else:
-                        raise AttributeError(curve_name, 'is not found in initial curves')
+                    instrument.forward_curve = self.__get_curve(group_rows['future']['ForwardCurve'])
                 elif isinstance(instrument, Swap.swap):
-                    array = ['swap', 'basis swap']
-                    discount_curve_name = self.curves_info_dict[key].loc[self.curves_info_dict[key]['Type'].isin(array)]\
-                        ['DiscountCurve'].iloc[0]
-                    forward_curve_name = self.curves_info_dict[key].loc[self.curves_info_dict[key]['Type'].isin(array)]\
-                        ['Leg2 ForwardCurve'].iloc[0]
-                    if discount_curve_name in self.curves_to_calibrate:
-                        instrument.leg1_discount_curve = self.curves_to_calibrate[discount_curve_name]
-                        instrument.leg2_discount_curve = self.curves_to_calibrate[discount_curve_name]
-                    elif discount_curve_name in self.input_curves_dict:
-                        instrument.leg1_discount_curve = self.input_curves_dict[discount_curve_name]
-                        instrument.leg2_discount_curve = self.input_curves_dict[discount_curve_name]
-                    else:
-                        raise AttributeError(discount_curve_name, 'is not found in initial curves')
-                    if forward_curve_name in self.curves_to_calibrate:
-                        instrument.leg2_forward_curve = self.curves_to_calibrate[forward_curve_name]
-                    elif forward_curve_name in self.input_curves_dict:
-                        instrument.leg2_forward_curve = self.input_curves_dict[forward_curve_name]
-                    else:
-                        raise AttributeError(forward_curve_name, 'is not found in initial curves')
+                    row = group_rows['swap']
+                    discount_curve = self.__get_curve(row['DiscountCurve'])
+                    instrument.leg1_discount_curve = discount_curve
+                    instrument.leg2_discount_curve = discount_curve
+                    instrument.leg2_forward_curve = self.__get_curve(row['Leg2 ForwardCurve'])
                     if instrument.is_basis_swap:
-                        forward_curve_name = self.curves_info_dict[key].loc[self.curves_info_dict[key]['Type'].isin(array)]\
-                            ['ForwardCurve'].iloc[0]
-                        if forward_curve_name in self.curves_to_calibrate:
-                            instrument.leg1_forward_curve = self.curves_to_calibrate[forward_curve_name]
-                        elif forward_curve_name in self.input_curves_dict:
-                            instrument.leg1_forward_curve = self.input_curves_dict[forward_curve_name]
-                        else:
-                            raise AttributeError(forward_curve_name, 'is not found in initial curves')
+                        instrument.leg1_forward_curve = self.__get_curve(row['ForwardCurve'])
                     instrument.update_cashflow_curves()
                 elif isinstance(instrument, FRA.fra):
-                    array = ['FRA']
-                    forward_curve_name = self.curves_info_dict[key].loc[self.curves_info_dict[key]['Type'].isin(array)]\
-                        ['ForwardCurve'].iloc[0]
-                    if forward_curve_name in self.curves_to_calibrate:
-                        instrument.forward_curve = self.curves_to_calibrate[forward_curve_name]
-                    elif forward_curve_name in self.input_curves_dict:
-                        instrument.forward_curve = self.input_curves_dict[forward_curve_name]
-                    else:
-                        raise AttributeError(forward_curve_name, 'is not found in initial curves')
+                    instrument.forward_curve = self.__get_curve(group_rows['fra']['ForwardCurve'])
                 elif isinstance(instrument, FXForward.fxforward):
-                    array = ['fx forward']
-                    dom_curve_name = self.curves_info_dict[key].loc[self.curves_info_dict[key]['Type'].isin(array)]\
-                        ['DiscountCurve'].iloc[0]
-                    for_curve_name = self.curves_info_dict[key].loc[self.curves_info_dict[key]['Type'].isin(array)]\
-                        ['Leg2 DiscountCurve'].iloc[0]
-                    if dom_curve_name in self.curves_to_calibrate:
-                        instrument.dom_curve = self.curves_to_calibrate[dom_curve_name]
-                    elif dom_curve_name in self.input_curves_dict:
-                        instrument.dom_curve = self.input_curves_dict[dom_curve_name]
-                    else:
-                        raise AttributeError(dom_curve_name, 'is not found in initial curves')
-                    if for_curve_name in self.curves_to_calibrate:
-                        instrument.for_curve = self.curves_to_calibrate[for_curve_name]
-                    elif for_curve_name in self.input_curves_dict:
-                        instrument.for_curve = self.input_curves_dict[for_curve_name]
-                    else:
-                        raise AttributeError(for_curve_name, 'is not found in initial curves')
+                    instrument.dom_curve = self.__get_curve(group_rows['fx forward']['DiscountCurve'])
+                    instrument.for_curve = self.__get_curve(group_rows['fx forward']['Leg2 DiscountCurve'])
                 else:
                     raise AttributeError(type(instrument), 'is not supported instrument type in curve calibration')
 
-    def update_curve_yvectors(self, ynews):
+    def __market_quote_to_target(self, instrument, market_quote):
+        # futures are quoted in price, fx forwards in outright, others in rate
+        if isinstance(instrument, Future.future):
+            return (100 - market_quote) / 100
+        if isinstance(instrument, FXForward.fxforward):
+            instrument.fx_forward = market_quote
+            return instrument.convert_marketquote_to_target()
+        return market_quote
+
+    def __get_curve(self, curve_name):
+        if curve_name in self.curve_map:
+            return self.curve_map[curve_name]
+        raise AttributeError(curve_name, 'is not found in initial curves')
+
+    def compile_pricing(self):
+        '''
+        instruments in targets order, rows of each curve kept to select a block of curves
+        call again after assigning new curve objects to the instruments
+        '''
+        instruments = []
+        self.instrument_rows = {}
+        for key, value in self.curve_instruments_dict.items():
+            self.instrument_rows[key] = np.arange(len(instruments), len(instruments) + len(value))
+            instruments += value
+        self.pricing_program = PricingProgram.pricingprogram(instruments)
+
+    def __block_rows(self, keys):
+        return np.concatenate([self.instrument_rows[key] for key in self.__block_keys(keys)])
+
+    def __block_keys(self, keys):
+        # keys of a curve block, in curves_to_calibrate order, all curves if keys is None
+        if keys is None:
+            return list(self.curves_to_calibrate.keys())
+        return [key for key in self.curves_to_calibrate if key in keys]
+
+    def update_curve_yvectors(self, ynews, keys=None):
         pos = 0
-        for key, value in self.curves_to_calibrate.items():
+        for key in self.__block_keys(keys):
+            value = self.curves_to_calibrate[key]
             if not isinstance(value, Curve.curve):
                 raise AttributeError('curves_to_calibrate value is not with type curve')
             value.update(ynews[pos:pos+value.y.shape[0]])
             pos += value.y.shape[0]
 
-    def compute_target(self):
-        computed_targets = []
+    def get_curve_yvectors(self, keys=None):
+        return np.concatenate([self.curves_to_calibrate[key].y for key in self.__block_keys(keys)])
+
+    def get_targets(self, keys=None):
+        if keys is None:
+            return self.targets
+        targets = []
+        pos = 0
         for key, value in self.curve_instruments_dict.items():
-            for instrument in value:
+            if key in keys:
+                targets.append(self.targets[pos:pos + len(value)])
+            pos += len(value)
+        return np.concatenate(targets)
+
+    def compute_target(self, keys=None):
+        if self.pricing_program is not None:
+            computed_targets = self.pricing_program.evaluate()
+            return computed_targets if keys is None else computed_targets[self.__block_rows(keys)]
+        computed_targets = []
+        for key in self.__block_keys(keys):
+            for instrument in self.curve_instruments_dict[key]:
                 computed_targets.append(instrument.compute_target_rate())
         computed_targets = np.array(computed_targets)
-        if computed_targets.shape[0] != self.targets.shape[0]:
+        if keys is None and computed_targets.shape[0] != self.targets.shape[0]:
             raise ValueError("computed targets and targets are not the same size")
         return computed_targets
 
+    def compute_jacobian(self, keys=None):
+        # column offset of each calibrated curve, sensitivities to curves outside the block are dropped
+        block_keys = self.__block_keys(keys)
+        offsets = {}
+        pos = 0
+        for key in block_keys:
+            value = self.curves_to_calibrate[key]
+            offsets[value] = pos
+            pos += value.y.shape[0]
+        if self.pricing_program is not None:
+            targets, jacobian = self.pricing_program.evaluate_jacobian(offsets, pos)
+            return jacobian if keys is None else jacobian[self.__block_rows(keys)]
+        jacobian = np.zeros((pos, pos))
+        row = 0
+        for key in block_keys:
+            for instrument in self.curve_instruments_dict[key]:
+                target, gradient = instrument.compute_target_rate_sensitivity()
+                for curve, y_bar in gradient.items():
+                    if curve in offsets:
+                        jacobian[row, offsets[curve]:offsets[curve] + y_bar.shape[0]] += y_bar
+                row += 1
+        return jacobian
+
+    def compute_jacobian_sparsity(self, keys=None):
+        block_keys = self.__block_keys(keys)
+        offsets = {}
+        pos = 0
+        for key in block_keys:
+            value = self.curves_to_calibrate[key]
+            offsets[value] = pos
+            pos += value.y.shape[0]
+        sparsity = np.zeros((pos, pos), dtype=bool)
+        row = 0
+        for key in block_keys:
+            for instrument in self.curve_instruments_dict[key]:
+                maturity = instrument.get_maturity()
+                for curve in instrument.get_curves():
+                    if curve in offsets:
+                        sparsity[row, offsets[curve]:offsets[curve] + curve.y.shape[0]] |= \
+                            curve.get_node_support(maturity)
+                row += 1
+        return sparsity
+
+    def get_curve_dependencies(self):
+        '''
+        :return: dict<curve_name, set<curve_name>>, calibrated curves the curve's instruments are priced on
+        '''
+        names = {}
+        for key, value in self.curves_to_calibrate.items():
+            names[value] = key
+        dependencies = {}
+        for key, value in self.curve_instruments_dict.items():
+            dependencies[key] = set()
+            for instrument in value:
+                target, gradient = instrument.compute_target_rate_sensitivity()
+                dependencies[key].update(names[curve] for curve in gradient if curve in names)
+        return dependencies
+
+    def __get_curve_graph(self):
+        # curve names (calibrated and input) the instruments of each calibrated curve are priced on
+        if self.curve_graph is None:
+            names = {}
+            for key, value in self.curve_map.items():
+                names[value] = key
+            self.curve_graph = {}
+            for key, value in self.curve_instruments_dict.items():
+                self.curve_graph[key] = set(names[curve] for instrument in value
+                                            for curve in instrument.get_curves()) - set([key])
+        return self.curve_graph
+
+    def set_market_quotes(self, quotes):
+        '''
+        :param quotes: dict<(curve_name, row), market quote>, row is the instrument position in the curve block
+        :return: set of curve names whose targets changed
+        '''
+        first_rows = {}
+        pos = 0
+        for key, value in self.curve_instruments_dict.items():
+            first_rows[key] = pos
+            pos += len(value)
+        changed = set()
+        for (key, row), market_quote in quotes.items():
+            if key not in self.curve_instruments_dict:
+                raise AttributeError(key, 'is not a calibrated curve')
+            instrument = self.curve_instruments_dict[key][row]
+            curve_df = self.curves_info_dict[key]
+            curve_df.iloc[row, curve_df.columns.get_loc('Market Quote')] = market_quote
+            if isinstance(instrument, Future.future):
+                instrument.target_rate = 0.01 * (100 - market_quote)
+            elif isinstance(instrument, Swap.swap):
+                instrument.set_target_rate(market_quote)
+            elif isinstance(instrument, FRA.fra):
+                instrument.target_rate = market_quote
+            target = self.__market_quote_to_target(instrument, market_quote)
+            if target != self.targets[first_rows[key] + row]:
+                self.targets[first_rows[key] + row] = target
+                changed.add(key)
+        return changed
+
+    def recalibrate(self, quotes=None, changed_curves=(), tol=1e-12, max_iterations=10):
+        '''
+        incremental calibration from the current curves, only curves with changed targets and the curves priced
+        on them are solved, by chord newton steps reusing the lu factors of the block jacobian
+        :param quotes: dict<(curve_name, row), market quote>, see set_market_quotes
+        :param changed_curves: names of curves updated outside, e.g. input curves shared with a parent
+                               curveconstructor that was recalibrated
+        :return: calibrationreport of the solved block, curve_names empty if nothing changed
+        '''
+        start = time.time()
+        changed = self.set_market_quotes(quotes) if quotes else set()
+        graph = self.__get_curve_graph()
+        changed.update(key for key, value in graph.items() if key in changed_curves or value & set(changed_curves))
+        block = set(changed)
+        while True:
+            dependents = set(key for key, value in graph.items() if value & block) - block
+            if not dependents:
+                break
+            block |= dependents
+        keys = self.__block_keys(block)
+        report = calibrationreport('incremental', keys)
+        report.max_abs_residual = 0.
+        if keys:
+            self.report = report
+            y = self.get_curve_yvectors(keys)
+            errors = calibration_object_function(y, self, keys)
+            cache_key = tuple(keys)
+            for iteration in range(max_iterations):
+                if np.max(np.abs(errors)) < tol:
+                    break
+                if cache_key not in self.jacobian_cache:
+                    self.jacobian_cache[cache_key] = lu_factor(calibration_jacobian(y, self, keys))
+                previous_norm = np.linalg.norm(errors)
+                y = y - lu_solve(self.jacobian_cache[cache_key], errors)
+                errors = calibration_object_function(y, self, keys)
+                if np.linalg.norm(errors) > 0.5 * previous_norm:
+                    # stale jacobian contracts too slowly, refactorized at the current curves on the next step
+                    del self.jacobian_cache[cache_key]
+            self.report = None
+            report.max_abs_residual = float(np.max(np.abs(errors)))
+        report.message = 'incremental converged' if report.max_abs_residual < tol else 'incremental not converged'
+        report.solver_time = time.time() - start
+        return report
+
+    def get_initial_yvectors(self, initial_curves, pillar_tol=5. / 365.):
+        '''
+        :param initial_curves: dict<curve_name, (x, y)>, e.g. from load_initial_curves
+        :param pillar_tol: year frac tolerance to match a pillar, covers the valuation date roll
+        :return: y vector in update_curve_yvectors order, number of matched pillars
+        '''
+        y_initial = []
+        matched = 0
+        for key, value in self.curves_to_calibrate.items():
+            y = np.zeros(value.y.shape[0])
+            if key in initial_curves:
+                x_prev, y_prev = initial_curves[key]
+                for i, pillar in enumerate(np.asarray(value.x, dtype=float)):
+                    distance = np.abs(x_prev - pillar)
+                    nearest = int(np.argmin(distance))
+                    if distance[nearest] <= pillar_tol:
+                        y[i] = y_prev[nearest]
+                        matched += 1
+            y_initial.append(y)
+        return np.concatenate(y_initial), matched
+
+    def bootstrap(self, tol=1e-12, max_iterations=20, max_sweeps=3, flat_start=True):
+        '''
+        pillar by pillar newton solve in maturity order, each instrument pins its own pillar,
+        gauss-seidel sweeps over curves for multi-curve coupling
+        :return: set of curve names with residual above tol after max_sweeps
+        '''
+        curve_targets = {}
+        pos = 0
+        for key, value in self.curve_instruments_dict.items():
+            curve_targets[key] = self.targets[pos:pos + len(value)]
+            pos += len(value)
+        unconverged = set(self.curves_to_calibrate.keys())
+        for sweep in range(max_sweeps):
+            for key, curve in self.curves_to_calibrate.items():
+                instruments = self.curve_instruments_dict[key]
+                for rank, i in enumerate(curve.order):
+                    if flat_start and sweep == 0 and rank > 0:
+                        # unsolved pillars start flat from the last solved one
+                        y = curve.y.copy()
+                        y[curve.order[rank:]] = y[curve.order[rank - 1]]
+                        curve.update(y)
+                    # chord newton, slope d target / d y[i] from the adjoint at the first iterate only
+                    target, gradient = instruments[i].compute_target_rate_sensitivity()
+                    if curve not in gradient or gradient[curve][i] == 0:
+                        continue
+                    slope = gradient[curve][i]
+                    for iteration in range(max_iterations):
+                        error = target - curve_targets[key][i]
+                        if abs(error) < tol:
+                            break
+                        y = curve.y.copy()
+                        y[i] -= error / slope
+                        curve.update(y)
+                        target = instruments[i].compute_target_rate()
+            unconverged = set()
+            for key in self.curves_to_calibrate:
+                errors = self.compute_target([key]) - curve_targets[key]
+                if np.max(np.abs(errors)) > tol:
+                    unconverged.add(key)
+            if not unconverged:
+                break
+        return unconverged
+
+    def get_residuals(self):
+        '''
+        :return: list<dict>, per instrument residual at the current curves, in targets order
+        '''
+        computed_targets = self.compute_target()
+        residuals = []
+        row = 0
+        for key, value in self.curve_instruments_dict.items():
+            curve_df = self.curves_info_dict[key]
+            for i in range(len(value)):
+                residuals.append({'curve': key,
+                                  'instrument': str(curve_df['Instruement'].iloc[i]),
+                                  'type': str(curve_df['Type'].iloc[i]),
+                                  'tenor': str(curve_df['Tenor'].iloc[i]),
+                                  'target': float(self.targets[row]),
+                                  'computed target': float(computed_targets[row]),
+                                  'residual': float(computed_targets[row] - self.targets[row])})
+                row += 1
+        return residuals
+
+    def get_leg_pv_stats(self, reset=False):
+        stats = {'evaluations': 0, 'skips': 0}
+        for key, value in self.curve_instruments_dict.items():
+            for instrument in value:
+                if not isinstance(instrument, Swap.swap):
+                    continue
+                for leg in (instrument.leg1, instrument.leg2):
+                    leg_stats = leg.get_pv_stats()
+                    stats['evaluations'] += leg_stats['evaluations']
+                    stats['skips'] += leg_stats['skips']
+                    if reset:
+                        leg.reset_pv_stats()
+        return stats
+
 def read_curves_info(file_path_name, curves_info_dict):
     '''
+    one pass over the file, rows are split into per curve blocks in memory, each block parsed once
     :param file_path_name: input file, which has curve instrumetns information
     :param curves_info_dict: pass by reference, dict, key: curve name, value: dataframe
     :return:
     '''
     curve_names = []
-    curve_row_pos = []
-    count = 1
+    curve_blocks = []
     with open(file_path_name) as fp:
         for line in fp:
             line_components = line.split(':')
             if line_components[0].upper() == 'CURVE':
                 curve_names.append(line_components[1].rstrip(',\n'))
-                curve_row_pos.append(count + 1)
-            count += 1
-    fp.close()
-    for i in range(len(curve_names)):
-        if i != len(curve_names) - 1:
-            row_pos_bottom = (count - 1) - (curve_row_pos[i+1]-1) + 1
-            curves_info_dict[curve_names[i]] = pd.read_csv(file_path_name, skiprows=curve_row_pos[i]-1,
-                                                      skipfooter=row_pos_bottom, engine='python')
-        else:
-            curves_info_dict[curve_names[i]] = pd.read_csv(file_path_name, skiprows=curve_row_pos[i] - 1)
+                curve_blocks.append([])
+            elif curve_blocks:
+                curve_blocks[-1].append(line)
+    for name, block in zip(curve_names, curve_blocks):
+        curves_info_dict[name] = pd.read_csv(io.StringIO(''.join(block)))
 
-def read_input_curves(val_date, file_path_name, input_curve_names, input_curves_dict):
+def read_input_curves(val_date, file_path_name, input_curve_names, input_curves_dict, interp_schemes={}):
+    '''
+    :param file_path_name: calibration result csv, or .npz curve store written by save_curve_store
+    :param interp_schemes: dict<curve_name, scheme>, default 'linear' for csv, the stored scheme for .npz
+    .npz curves must be stored for val_date, pillars are year fracs from the stored valuation date
+    '''
     if not input_curve_names:
         return
+    if file_path_name.lower().endswith('.npz'):
+        stored_curves = load_curve_store(file_path_name, input_curve_names)
+        for name, (stored_val_date, x, y, interp_scheme) in stored_curves.items():
+            if stored_val_date != np.datetime64(val_date, 'D'):
+                raise ValueError(name, 'is stored for val date', stored_val_date, 'not for', val_date)
+            input_curves_dict[name] = Curve.curve(name, val_date, x, y,
+                                                  interp_scheme=interp_schemes.get(name, interp_scheme))
+        return
     curves_info_dict = {}
     read_curves_info(file_path_name, curves_info_dict)
     for name in input_curve_names:
         if name in curves_info_dict:
             x = np.array(curves_info_dict[name]['maturity year frac'])
             y = np.array(curves_info_dict[name]['zero rate'])
-            input_curves_dict[name] = Curve.curve(name, val_date, x, y)
+            input_curves_dict[name] = Curve.curve(name, val_date, x, y,
+                                                  interp_scheme=interp_schemes.get(name, 'linear'))
         else:
             raise ValueError(name, "is not found in input curve result file")
 
-def calibration_object_function(yvalues, curve_constructor):
+def save_curve_store(curves, file_path_name):
+    '''
+    binary curve store, all curves concatenated in one .npz, curve i is x[offsets[i]:offsets[i + 1]]
+    :param curves: dict<curve_name, curve>
+    '''
+    names = list(curves.keys())
+    sizes = [curves[name].y.shape[0] for name in names]
+    np.savez(file_path_name,
+             names=np.array(names, dtype=str),
+             val_dates=np.array([np.datetime64(curves[name].val_date, 'D') for name in names]),
+             interp_schemes=np.array([curves[name].interp_scheme for name in names], dtype=str),
+             offsets=np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64),
+             x=np.concatenate([np.asarray(curves[name].x, dtype=float) for name in names]),
+             y=np.concatenate([curves[name].y for name in names]))
+
+def load_curve_store(file_path_name, curve_names=None):
+    '''
+    :param curve_names: curves to load, default all curves of the store
+    :return: dict<curve_name, (val_date, x, y, interp_scheme)>, val_date as datetime64[D]
+    '''
+    stat = os.stat(file_path_name)
+    key = (os.path.abspath(file_path_name), stat.st_mtime_ns, stat.st_size)
+    if key not in CURVE_STORE_CACHE:
+        for stale in [stale for stale in CURVE_STORE_CACHE if stale[0] == key[0]]:
+            del CURVE_STORE_CACHE[stale]
+        if len(CURVE_STORE_CACHE) >= CURVE_STORE_CACHE_SIZE:
+            del CURVE_STORE_CACHE[next(iter(CURVE_STORE_CACHE))]
+        with np.load(file_path_name) as store:
+            CURVE_STORE_CACHE[key] = (list(store['names']), store['offsets'], store['x'], store['y'],
+                                      store['val_dates'], store['interp_schemes'])
+    names, offsets, x, y, val_dates, interp_schemes = CURVE_STORE_CACHE[key]
+    if curve_names is None:
+        curve_names = names
+    curves = {}
+    for name in curve_names:
+        if name not in names:
+            raise ValueError(name, "is not found in curve store")
+        i = names.index(name)
+        curves[name] = (val_dates[i], x[offsets[i]:offsets[i + 1]].copy(), y[offsets[i]:offsets[i + 1]].copy(),
+                        str(interp_schemes[i]))
+    return curves
+
+def load_initial_curves(initial_curves):
+    '''
+    :param initial_curves: calibration result file path (csv or .npz curve store), or dict<curve_name, curve>
+    :return: dict<curve_name, (x, y)>, pillars in year frac and zero rates
+    '''
+    if isinstance(initial_curves, str) and initial_curves.lower().endswith('.npz'):
+        return {name: (x, y) for name, (val_date, x, y, interp_scheme) in load_curve_store(initial_curves).items()}
+    if isinstance(initial_curves, str):
+        curves_info_dict = {}
+        read_curves_info(initial_curves, curves_info_dict)
+        return {name: (np.array(df['maturity year frac'], dtype=float), np.array(df['zero rate'], dtype=float))
+                for name, df in curves_info_dict.items()}
+    return {name: (np.asarray(value.x, dtype=float), np.asarray(value.y, dtype=float))
+            for name, value in initial_curves.items()}
+
+def calibration_object_function(yvalues, curve_constructor, keys=None):
     '''
     object function for levmar solver
     :param yvalues:
     :param curve_constructor:
+    :param keys: optional curve names, solve a block of curves only, others are kept fixed
     :return:
         calibration error, computed targets minus true targets
     '''
     if not isinstance(curve_constructor, curveconstructor):
         raise AttributeError("class object curveconstructor is not passed to calibration function properly")
-    curve_constructor.update_curve_yvectors(yvalues)
-    return curve_constructor.compute_target() - curve_constructor.targets
+    start = time.time()
+    curve_constructor.update_curve_yvectors(yvalues, keys)
+    update_end = time.time()
+    errors = curve_constructor.compute_target(keys) - curve_constructor.get_targets(keys)
+    if curve_constructor.report is not None:
+        curve_constructor.report.record_evaluation(update_end - start, time.time() - update_end, errors, yvalues)
+    return errors
+
+def calibration_jacobian(yvalues, curve_constructor, keys=None):
+    '''
+    analytic jacobian of calibration_object_function for levmar solver (Dfun)
+    '''
+    if not isinstance(curve_constructor, curveconstructor):
+        raise AttributeError("class object curveconstructor is not passed to calibration function properly")
+    start = time.time()
+    curve_constructor.update_curve_yvectors(yvalues, keys)
+    update_end = time.time()
+    jacobian = curve_constructor.compute_jacobian(keys)
+    if curve_constructor.report is not None:
+        curve_constructor.report.record_jacobian(update_end - start, time.time() - update_end)
+    return jacobian
 
-def save_calibration_results(curve_constructor, output_file_pathname):
+def save_calibration_results(curve_constructor, output_file_pathname, computed_targets=None):
+    '''
+    human readable csv export of the calibrated curves
+    :param computed_targets: targets at the calibrated curves in targets order, computed once if None
+    '''
+    if computed_targets is None:
+        computed_targets = curve_constructor.compute_target()
     f = open(output_file_pathname, "w+")
     f.close()
     keys = curve_constructor.curves_to_calibrate.keys()
     # curves_dfs = {}
+    pos = 0
     for key in keys:
         curves_df = curve_constructor.curves_info_dict[key]
         curves_df['maturity year frac'] = [i.get_maturity() for i in curve_constructor.curve_instruments_dict[key]]
         curves_df['zero rate'] = curve_constructor.curves_to_calibrate[key].interp(curves_df['maturity year frac'])
-        curves_df['recomputed curve targets'] = [i.compute_target_rate() for i in curve_constructor.curve_instruments_dict[key]]
+        curves_df['recomputed curve targets'] = computed_targets[pos:pos + curves_df.shape[0]]
+        pos += curves_df.shape[0]
         # curves_dfs[key] = curves_df
         with open(output_file_pathname,'a') as f:
             f.write(f"Curve:{key}")
             f.write("\n")
         f.close()
         curves_df.to_csv(output_file_pathname, mode = 'a', index = False)
+
 def calibrate_curves(val_date, input_file_pathname, output_file_pathname,
-                     curves_to_calibrate, input_curve_names, input_curve_result_pathname = ''):
+                     curves_to_calibrate, input_curve_names, input_curve_result_pathname = '', interp_schemes={},
+                     use_jacobian=True, method='levmar', initial_curves=None, pillar_tol=5. / 365.,
+                     write_report=False, curve_store_pathname=''):
+    '''
+    :param interp_schemes: dict<curve_name, scheme>, interpolation scheme of calibrated and input curves,
+                           'linear', 'loglinear', 'cubic' or 'monotoneconvex', default 'linear'
+    :param use_jacobian: if True, pass the analytic jacobian to the solver, otherwise finite difference
+    :param method: 'levmar', global leastsq on all curves, or 'bootstrap', pillar by pillar solve,
+                   leastsq only on the block of curves not converged by the bootstrap,
+                   or 'trf', least_squares trust region, finite difference jacobian uses the sparsity pattern
+    :param initial_curves: optional warm start, previous result file path or dict<curve_name, curve>,
+                           pillars matched within pillar_tol year frac, unmatched pillars start from zero
+    :param write_report: if True, calibration report is written next to the result csv, <name>_report.json
+    :param curve_store_pathname: if not empty, calibrated curves are saved to this .npz curve store,
+                                 output_file_pathname can then be empty to skip the csv export
+    :param input_curve_result_pathname: parent curves, calibration result csv or .npz curve store
+    :return: calibrationreport
+    '''
 
     # curve instruments detail, input
     curves_info_dict = {}
@@ -272,19 +785,287 @@ def calibrate_curves(val_date, input_file_pathname, output_file_pathname,
 
     # parent curves as input, e.g., to calibrate 6m curve, ois and 3m curve are input
     input_curves_dict = {}
-    read_input_curves(val_date, input_curve_result_pathname, input_curve_names, input_curves_dict)
+    read_input_curves(val_date, input_curve_result_pathname, input_curve_names, input_curves_dict, interp_schemes)
+
+    curve_constructor, report = solve_curves(val_date, curves_info_dict, curves_to_calibrate, input_curves_dict,
+                                             output_file_pathname, interp_schemes, use_jacobian, method,
+                                             initial_curves, pillar_tol, write_report, curve_store_pathname)
+    return report
 
+def solve_curves(val_date, curves_info_dict, curves_to_calibrate, input_curves_dict, output_file_pathname='',
+                 interp_schemes={}, use_jacobian=True, method='levmar', initial_curves=None, pillar_tol=5. / 365.,
+                 write_report=False, curve_store_pathname='', verbose=True):
+    '''
+    calibrate curves_to_calibrate from instruments already read in memory, parent curves in input_curves_dict
+    :param output_file_pathname: result csv file, skipped if empty
+    :param curve_store_pathname: result .npz curve store, skipped if empty
+    :param write_report: if True, calibration report is written to <result file>_report.json
+    :param verbose: if False, solver telemetry is not printed, it is still recorded in the report
+    :return: curveconstructor holding the calibrated curves, calibrationreport
+    '''
+    if method not in ('levmar', 'bootstrap', 'trf'):
+        raise ValueError(method, 'is not supported calibration method')
     # curveconstructor class, hold instruments and its curves
-    curve_constructor = curveconstructor(val_date, curves_info_dict, curves_to_calibrate, input_curves_dict)
-    y_initial = np.zeros(len(curve_constructor.targets))
     start = time.time()
-    y_calibration, success = leastsq(calibration_object_function, y_initial, args=(curve_constructor,))
+    curve_constructor = curveconstructor(val_date, curves_info_dict, curves_to_calibrate, input_curves_dict,
+                                         interp_schemes)
+    report = calibrationreport(method, curve_constructor.curves_to_calibrate.keys())
+    report.construction_time = time.time() - start
+    report.finite_difference = not use_jacobian
+    curve_constructor.report = report
+    curve_constructor.get_leg_pv_stats(reset=True)
+    start = time.time()
+    y_start = np.zeros(len(curve_constructor.targets))
+    if initial_curves is not None:
+        y_start, matched = curve_constructor.get_initial_yvectors(load_initial_curves(initial_curves), pillar_tol)
+        curve_constructor.update_curve_yvectors(y_start)
+        if verbose:
+            print('warm start, pillars matched', matched, 'of', y_start.shape[0])
+    block = None
+    if method == 'bootstrap':
+        unconverged = curve_constructor.bootstrap(flat_start=initial_curves is None)
+        report.bootstrap_time = time.time() - start
+        report.message = 'bootstrap not converged ' + ', '.join(sorted(unconverged)) if unconverged \
+            else 'bootstrap converged'
+        if verbose:
+            print('bootstrap computation time', report.bootstrap_time, 'not converged', sorted(unconverged))
+        # fall back to the solver on the unconverged curves and the curves priced on them
+        dependencies = curve_constructor.get_curve_dependencies()
+        block = set(unconverged)
+        while block:
+            dependents = set(key for key, value in dependencies.items() if value & block) - block
+            if not dependents:
+                break
+            block |= dependents
+    if method == 'levmar' or block:
+        y_initial = curve_constructor.get_curve_yvectors(block) if method == 'bootstrap' else y_start
+        y_calibration, cov, info, message, success = leastsq(calibration_object_function, y_initial,
+                                                             args=(curve_constructor, block),
+                                                             Dfun=calibration_jacobian if use_jacobian else None,
+                                                             full_output=True)
+        report.exit_code = int(success)
+        report.message = message
+        if verbose:
+            print('solver function evaluations', info['nfev'], 'jacobian evaluations', info.get('njev', 0))
+        curve_constructor.update_curve_yvectors(y_calibration, block)
+    if method == 'trf':
+        sparsity = curve_constructor.compute_jacobian_sparsity()
+        if verbose:
+            print('jacobian sparsity, non zeros', int(sparsity.sum()), 'of', sparsity.size)
+        result = least_squares(calibration_object_function, y_start, args=(curve_constructor,),
+                               jac=calibration_jacobian if use_jacobian else '2-point',
+                               jac_sparsity=None if use_jacobian else sparsity,
+                               method='trf', ftol=1e-14, xtol=1e-14, gtol=1e-14)
+        report.exit_code = int(result.status)
+        report.message = result.message
+        if verbose:
+            print('solver function evaluations', result.nfev, 'jacobian evaluations', result.njev)
+        curve_constructor.update_curve_yvectors(result.x)
     end = time.time()
-    print('solver computation time', end - start)
+    report.solver_time = end - start
+    curve_constructor.report = None
+    report.residuals = curve_constructor.get_residuals()
+    report.max_abs_residual = max(abs(row['residual']) for row in report.residuals)
+    if verbose:
+        print('solver computation time', end - start)
+        print('solver exit code', report.exit_code, report.message, 'max abs residual', report.max_abs_residual)
+        # curve memo cache is off for calibrated curves, every solver step clears it, leg pv cache is only used by
+        # instrument by instrument pricing, e.g. the bootstrap, the compiled pricing program queries the curve
+        # engines directly
+        for key, value in curve_constructor.curves_to_calibrate.items():
+            stats = value.get_cache_stats()
+            if stats['hits'] + stats['misses'] > 0:
+                print('curve cache', key, 'hits', stats['hits'], 'misses', stats['misses'],
+                      'updates', stats['version'])
+            else:
+                print('curve', key, 'updates', stats['version'])
+        stats = curve_constructor.get_leg_pv_stats()
+        if stats['evaluations'] + stats['skips'] > 0:
+            print('swap leg evaluations', stats['evaluations'], 'skipped', stats['skips'])
+
+    if curve_store_pathname:
+        save_curve_store(curve_constructor.curves_to_calibrate, curve_store_pathname)
+    # # save result back to csv file, targets at the calibrated curves are already in the report
+    if output_file_pathname:
+        save_calibration_results(curve_constructor, output_file_pathname,
+                                 np.array([row['computed target'] for row in report.residuals]))
+        if write_report:
+            report.save_json(os.path.splitext(output_file_pathname)[0] + '_report.json')
+    return curve_constructor, report
+
+def curve_dependency_graph(curves_info_dict):
+    '''
+    parent curves of each curve, read from the curve columns of its instruments without pricing,
+    see curveconstructor.get_curve_dependencies for the calibrated curves the pricing depends on
+    :return: dict<curve_name, set<curve_name>>, the curve itself excluded
+    '''
+    dependencies = {}
+    for key, value in curves_info_dict.items():
+        parents = set()
+        types = value['Type'].str.lower()
+        for instrument_type, columns in INSTRUMENT_CURVE_COLUMNS.items():
+            rows = value.loc[types == instrument_type]
+            for column in columns:
+                parents.update(name for name in rows[column].dropna() if name != 'na')
+        parents.discard(key)
+        dependencies[key] = parents
+    return dependencies
 
-    # # save result back to csv file
-    curve_constructor.update_curve_yvectors(y_calibration)
-    save_calibration_results(curve_constructor, output_file_pathname)
+def build_calibration_sets(dependencies, curve_names):
+    '''
+    dag of calibration sets, curves depending on each other (strongly connected) are solved in one set
+    :param curve_names: curves to calibrate, their parent curves are added
+    :return: list<set<curve_name>> in topological order, dict<set index, set<parent set index>>
+    '''
+    required = set()
+    stack = list(curve_names)
+    while stack:
+        name = stack.pop()
+        if name in required:
+            continue
+        if name not in dependencies:
+            raise AttributeError(name, 'is not defined in curves_info_dict')
+        required.add(name)
+        stack.extend(dependencies[name])
+    reachable = {}
+    for name in required:
+        seen = set()
+        stack = list(dependencies[name])
+        while stack:
+            parent = stack.pop()
+            if parent not in seen:
+                seen.add(parent)
+                stack.extend(dependencies[parent])
+        reachable[name] = seen
+    calibration_sets = []
+    set_index = {}
+    # parents first, a set is ready once every curve it reaches outside itself is placed
+    remaining = sorted(required)
+    while remaining:
+        ready = [name for name in remaining
+                 if all(parent in set_index or name in reachable[parent] for parent in reachable[name])]
+        if not ready:
+            raise ValueError('curve dependencies can not be ordered')
+        name = ready[0]
+        members = set([name]) | set(parent for parent in reachable[name] if name in reachable[parent])
+        for member in members:
+            set_index[member] = len(calibration_sets)
+        calibration_sets.append(members)
+        remaining = [name for name in remaining if name not in members]
+    set_parents = {}
+    for i, members in enumerate(calibration_sets):
+        set_parents[i] = set(set_index[parent] for name in members for parent in dependencies[name]) - set([i])
+    return calibration_sets, set_parents
+
+def calibrate_curve_set(val_date, curves_info_dict, curve_names, parent_curves, interp_schemes={},
+                        output_file_pathname='', method='levmar', verbose=False):
+    '''
+    worker of calibrate_curve_dag, parent curves and results are passed in memory as dict<curve_name, (x, y)>
+    '''
+    input_curves_dict = {}
+    for name, (x, y) in parent_curves.items():
+        input_curves_dict[name] = Curve.curve(name, val_date, x, y, interp_scheme=interp_schemes.get(name, 'linear'))
+    curves_to_calibrate = {}
+    for name in curves_info_dict:
+        if name in curve_names:
+            curves_to_calibrate[name] = pd.DataFrame()
+    curve_constructor, report = solve_curves(val_date, curves_info_dict, curves_to_calibrate, input_curves_dict,
+                                             output_file_pathname, interp_schemes, True, method, verbose=verbose)
+    return {name: (np.asarray(value.x, dtype=float), value.y)
+            for name, value in curve_constructor.curves_to_calibrate.items()}
+
+def calibrate_curve_dag(val_date, input_file_pathnames, curve_names=None, output_dir='', interp_schemes={},
+                        method='levmar', max_workers=None, verbose=False):
+    '''
+    calibrate curves of several input files, independent calibration sets run concurrently in a process pool,
+    a set is submitted as soon as its parent sets are done, parent curves are passed in memory
+    :param input_file_pathnames: list of calibration input files, curve names must be unique across files
+    :param curve_names: curves to calibrate, parents are added, default all curves of the input files
+                        curveconstructor can build, curves with other instrument types (mtmxccy basis swap)
+                        are skipped
+    :param output_dir: if not empty, each set writes <curve names>_result.csv in it
+    :param verbose: if True, solver telemetry of every set is printed by its worker, and one line per finished set
+    :return: dict<curve_name, curve>
+    '''
+    curves_info_dict = {}
+    for file_path_name in input_file_pathnames:
+        read_curves_info(file_path_name, curves_info_dict)
+    if curve_names is None:
+        curve_names = [key for key, value in curves_info_dict.items()
+                       if value['Type'].str.lower().isin(INSTRUMENT_CURVE_COLUMNS.keys()).all()]
+    calibration_sets, set_parents = build_calibration_sets(curve_dependency_graph(curves_info_dict), curve_names)
+    results = {}
+    done = set()
+    running = {}
+    start = time.time()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        while len(done) < len(calibration_sets):
+            for i, members in enumerate(calibration_sets):
+                if i in done or i in running.values() or not set_parents[i] <= done:
+                    continue
+                parent_curves = {}
+                for j in set_parents[i]:
+                    for name in calibration_sets[j]:
+                        parent_curves[name] = results[name]
+                output_file_pathname = ''
+                if output_dir:
+                    output_file_pathname = os.path.join(output_dir, '_'.join(sorted(members)) + '_result.csv')
+                set_info = dict((name, curves_info_dict[name]) for name in curves_info_dict if name in members)
+                running[executor.submit(calibrate_curve_set, val_date, set_info, members, parent_curves,
+                                        interp_schemes, output_file_pathname, method, verbose)] = i
+            finished, pending = concurrent.futures.wait(list(running.keys()),
+                                                        return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                i = running.pop(future)
+                results.update(future.result())
+                done.add(i)
+                if verbose:
+                    print('calibration set', sorted(calibration_sets[i]), 'done', time.time() - start)
+    return dict((name, Curve.curve(name, val_date, x, y, interp_scheme=interp_schemes.get(name, 'linear')))
+                for name, (x, y) in results.items())
+
+def calibrate_history(val_dates, curves_info_dict, quote_history, curve_names, store_dir='', input_store_dir='',
+                      input_curve_names=[], interp_schemes={}, method='levmar', pillar_tol=5. / 365.):
+    '''
+    calibrate the same curves on every date from quotes in memory, each date is warm started from the curves
+    of the previous date, solver telemetry is replaced by one line per date
+    :param val_dates: list of dates, in calibration order
+    :param curves_info_dict: instrument layout, dict<curve_name, dataframe> as read by read_curves_info
+    :param quote_history: dict<curve_name, dataframe>, market quotes indexed by date, one column per instrument row,
+                          curves not in quote_history keep the layout market quotes
+    :param curve_names: curves to calibrate
+    :param store_dir: if not empty, calibrated curves of every date are appended to this CurveCube store
+    :param input_store_dir: CurveCube store of the parent curves input_curve_names, e.g. an earlier run
+    :return: list<calibrationreport>, one per date
+    '''
+    reports = []
+    previous_curves = None
+    for val_date in val_dates:
+        start = time.time()
+        date_info_dict = {}
+        for name in curve_names:
+            date_info_dict[name] = curves_info_dict[name].copy()
+            if name in quote_history:
+                date_info_dict[name]['Market Quote'] = np.asarray(quote_history[name].loc[val_date], dtype=float)
+        input_curves_dict = {}
+        for name in input_curve_names:
+            x, y, interp_scheme = CurveCube.read_curve_on_date(input_store_dir, name, val_date)
+            input_curves_dict[name] = Curve.curve(name, val_date, x, y,
+                                                  interp_scheme=interp_schemes.get(name, interp_scheme))
+        curves_to_calibrate = {}
+        for name in curves_info_dict:
+            if name in curve_names:
+                curves_to_calibrate[name] = pd.DataFrame()
+        curve_constructor, report = solve_curves(val_date, date_info_dict, curves_to_calibrate, input_curves_dict,
+                                                 '', interp_schemes, True, method, previous_curves, pillar_tol,
+                                                 verbose=False)
+        if store_dir:
+            CurveCube.append_curves(store_dir, curve_constructor.curves_to_calibrate)
+        previous_curves = curve_constructor.curves_to_calibrate
+        reports.append(report)
+        print(val_date.strftime('%Y-%m-%d'), 'calibrated', sorted(curves_to_calibrate.keys()), 'nfev', report.nfev,
+              'max abs residual', report.max_abs_residual, 'time', time.time() - start)
+    return reports
 
 if __name__ == '__main__':
     val_date = dt.datetime(year=2020, month=1, day=2)
@@ -5,16 +5,83 @@ Author:      YANG YIFAN
 Created:     2020
 """
 
+import numpy as np
 import pandas as pd
 import Curve
 
+def month_range_day64(start, periods, months):
+    '''
+    monthly date grid as datetime64[D], start + k * months, day clipped to month end
+    '''
+    start_day = np.datetime64(start, 'D')
+    start_month = start_day.astype('datetime64[M]')
+    day = (start_day - start_month.astype('datetime64[D]')).astype(np.int64)
+    grid_months = start_month + np.arange(periods) * months
+    first_days = grid_months.astype('datetime64[D]')
+    month_length = ((grid_months + 1).astype('datetime64[D]') - first_days).astype(np.int64)
+    return first_days + np.minimum(day, month_length - 1)
+
 def month_range_day(start=None, periods=None, month_freq='1M'):
-    start_date = pd.Timestamp(start).date()
-    month_range = pd.date_range(start=start_date, periods=periods, freq=month_freq)
-    month_day = month_range.day.values
-    month_day[start_date.day < month_day] = start_date.day
-    timestamps = pd.to_datetime(month_range.year*10000+month_range.month*100+month_day, format='%Y%m%d')
-    return timestamps.to_pydatetime()
+    dates = month_range_day64(start, periods, int(month_freq[0:-1]))
+    return dates.astype('datetime64[us]').astype(object)
+
+# memoized schedules, key (val_date, tenor, leg_freq, stub), value (start_dates, end_dates)
+schedule_cache = {}
+schedule_cache_size = 65536
+
+def generate_schedule(val_date, tenor, leg_freq, stub='front'):
+    '''
+    accrual schedule of a leg, incomplete period up front (stub period)
+    e.g., leg period freq 12m, trade tenor 18m, we have a stub period 6m, and a full period 12m
+    :param tenor: trade tenor, e.g., '18M', '10Y'
+    :param leg_freq: leg frequency in month unit, e.g., '3M'
+    :param stub: only 'front' stub is supported
+    :return: start_dates, end_dates, read only numpy datetime64[D] arrays, shared by all callers
+    '''
+    key = (np.datetime64(val_date, 'D'), tenor.upper(), leg_freq.upper(), stub)
+    schedule = schedule_cache.get(key)
+    if schedule is not None:
+        return schedule
+    if stub != 'front':
+        raise ValueError('only front stub period is supported')
+    tenor_unit = tenor[-1].upper()
+    tenor_length = int(tenor[0:-1])
+    freq_unit = leg_freq[-1].upper()
+    if not freq_unit == 'M':
+        raise ValueError('leg frequency mut be defined in month unit')
+    freq_length = int(leg_freq[0:-1])
+    if tenor_unit == 'Y':
+        periods = -(-tenor_length * 12 // freq_length)
+        sub_period = tenor_length * 12 % freq_length
+    else:
+        periods = -(-tenor_length // freq_length)
+        sub_period = tenor_length % freq_length
+    if sub_period != 0:
+        sub_dates = month_range_day64(val_date, 2, sub_period)
+        start_dates = sub_dates[:1]
+        end_dates = sub_dates[1:]
+        ## 1 stub period, 1 full period
+        if periods == 2:
+            start_dates = sub_dates
+            end_dates = np.array([sub_dates[1], month_range_day64(sub_dates[1], 2, freq_length)[-1]])
+        ## multiple full periods
+        elif periods > 2:
+            start_dates = month_range_day64(sub_dates[1], periods - 1, freq_length)
+            end_dates = month_range_day64(start_dates[1], periods - 1, freq_length)
+            start_dates = np.concatenate([sub_dates[:1], start_dates])
+            end_dates = np.concatenate([sub_dates[1:], end_dates])
+    else:
+        start_dates = month_range_day64(val_date, periods, freq_length)
+        if periods == 1:
+            end_dates = month_range_day64(start_dates[0], 2, freq_length)[1:]
+        else:
+            end_dates = month_range_day64(start_dates[1], periods, freq_length)
+    start_dates.setflags(write=False)
+    end_dates.setflags(write=False)
+    if len(schedule_cache) >= schedule_cache_size:
+        del schedule_cache[next(iter(schedule_cache))]
+    schedule_cache[key] = (start_dates, end_dates)
+    return start_dates, end_dates
 
 class CashFlow(object):
     '''
@@ -31,6 +98,8 @@ class CashFlow(object):
     currency: string
     discount_curve: curve
     forward_curve: curve
+    start_yf, end_yf: double, year frac of start/end date from val_date, set once at construction
+    accrual: double, year frac of the accrual period
 
     Methods
     =======
@@ -38,6 +107,8 @@ class CashFlow(object):
         compute cashflow at payment date
     compute_cashflow_pv() :
         compute cashflow, discount to valuation date
+    compute_cashflow_pv_sensitivity(include_margin, gradient) :
+        return (pv, gradient), gradient is dict curve -> d pv / d curve.y, one reverse sweep
     __init__(name, is_float, val_date, start_date, end_date, notional, rate, currency, discount_curve, forward_curve) :
         initiate cashflow object
     '''
@@ -54,6 +125,12 @@ class CashFlow(object):
         self.is_float = is_float
         self.discount_curve = discount_curve
         self.forward_curve = forward_curve
+        # pricing works on day offsets from val_date, no date arithmetic after construction
+        start_day = Curve.day_offset(val_date, start_date)
+        end_day = Curve.day_offset(val_date, end_date)
+        self.start_yf = start_day / 365.
+        self.end_yf = end_day / 365.
+        self.accrual = (end_day - start_day) / 365.
 
     def compute_cashflow(self, include_margin=True):
         '''
@@ -63,53 +140,216 @@ class CashFlow(object):
         if self.is_float:
             if not isinstance(self.forward_curve, Curve.curve):
                 raise ValueError('forward curve is not initialized for float cashflow')
-            self.rate = self.forward_curve.get_forward_rate(self.start_date, self.end_date)
-        year_frac = (self.end_date - self.start_date).days / 365.
+            self.rate = self.forward_curve.get_forward_rate_yf(self.start_yf, self.end_yf)
         if include_margin:
-            return self.notional * (self.rate + self.margin) * year_frac
+            return self.notional * (self.rate + self.margin) * self.accrual
         else:
-            return self.notional * self.rate * year_frac
+            return self.notional * self.rate * self.accrual
 
     def compute_cashflow_pv(self, include_margin=True):
         '''
         :return:
          cashflow discount to valuation date
         '''
-        if self.end_date <= self.val_date:
+        if self.end_yf <= 0:
             raise ValueError('cashflow payment date is before valuation date')
-        payment_day = (self.end_date - self.val_date).days / 365.
-        df = self.discount_curve.get_discount_factor(payment_day)
+        df = self.discount_curve.get_discount_factor(self.end_yf)
         return self.compute_cashflow(include_margin) * df
 
+    def compute_cashflow_pv_sensitivity(self, include_margin=True, gradient=None, pv_bar=1.):
+        if gradient is None:
+            gradient = {}
+        pv = self.compute_cashflow_pv(include_margin)
+        df = self.discount_curve.get_discount_factor(self.end_yf)
+        # pv = cashflow * df, cashflow = notional * (fwd + margin) * accrual
+        Curve.add_gradient(gradient, self.discount_curve,
+                           self.discount_curve.get_discount_factor_adjoint(self.end_yf, pv_bar * pv / df))
+        if self.is_float:
+            Curve.add_gradient(gradient, self.forward_curve,
+                               self.forward_curve.get_forward_rate_adjoint(self.start_yf, self.end_yf,
+                                                                           pv_bar * self.notional * self.accrual * df))
+        return pv, gradient
+
 class leg(object):
     '''
-    leg class, a holder of cashflows
+    leg class, a holder of cashflows, stored column-wise in numpy arrays
+    Attributes
+    ==========
+    is_float : bool
+    val_date : valuation date
+    start_dates, end_dates : numpy datetime64[D] arrays
+    start_yf, end_yf : numpy double, year frac of period start/end (payment) from val_date
+    accrual : numpy double, year frac of accrual periods
+    notional, rate, margin : numpy double
+    discount_curve: curve
+    forward_curve: curve
+    cashflows : list<CashFlow>, per cashflow view of the columns, built on first access
+    pv_cache : dict, last leg components keyed by annuity curve, valid while curves and versions are the same
+    evaluations, skips : int, number of leg repricings and of cache hits
 
+    Methods
+    =======
+    set_curves(discount_curve, forward_curve) :
+        assign curves to the leg and its cashflow view
+    set_rates(rate, margin) :
+        reset fixed rates and margins, drops the cashflow view and the pv cache
+    compute_rates() :
+        return coupon rates, forward rates for float leg, fixed rates otherwise
+    compute_leg_pv(include_margin) :
+        return pv of all cashflows in one vectorized curve call
+    compute_annuity(discount_curve) :
+        return sum of notional * accrual * df
+    compute_leg_pv_sensitivity(include_margin, gradient, pv_bar) :
+        return (pv, gradient), gradient is dict curve -> pv_bar * d pv / d curve.y
+    compute_annuity_sensitivity(discount_curve, gradient, annuity_bar) :
+        return (annuity, gradient)
+    compute_leg_components(annuity_curve) :
+        return (pv, pv excluding margin, annuity) from one discount and one forward curve call,
+        cached until one of the curves used is updated
+    get_pv_stats() :
+        return leg evaluation/skip counters
+    __init__(is_float, val_date, cashflows_info, discount_curve, forward_curve) :
+        cashflows_info is a DataFrame or dict with columns
+        'start date', 'end date', 'notional', 'fixed rate', 'margin'
     '''
     def __init__(self, is_float, val_date, cashflows_info, discount_curve=None, forward_curve=None):
         self.is_float = is_float
         self.val_date = val_date
-        if not isinstance(cashflows_info, pd.DataFrame):
+        if not isinstance(cashflows_info, (pd.DataFrame, dict)):
             raise ValueError('cashflows info are not initialized in dataframe')
-        cashflows = []
-        for index, row in cashflows_info.iterrows():
-            start_date = row['start date']
-            end_date = row['end date']
-            notional = row['notional']
-            rate = row['fixed rate']
-            margin = row['margin']
-            cashflows.append(CashFlow(val_date, start_date, end_date, is_float, notional, rate, margin,
-                                      discount_curve=discount_curve, forward_curve=forward_curve))
-        self.cashflows = cashflows
+        self.start_dates = np.asarray(cashflows_info['start date'], dtype='datetime64[D]')
+        self.end_dates = np.asarray(cashflows_info['end date'], dtype='datetime64[D]')
+        start_days = Curve.day_offset(val_date, self.start_dates)
+        end_days = Curve.day_offset(val_date, self.end_dates)
+        self.start_yf = start_days / 365.
+        self.end_yf = end_days / 365.
+        self.accrual = (end_days - start_days) / 365.
+        size = self.start_yf.shape[0]
+        self.notional = np.asarray(cashflows_info['notional'], dtype=float) * np.ones(size)
+        self.rate = np.asarray(cashflows_info['fixed rate'], dtype=float) * np.ones(size)
+        self.margin = np.asarray(cashflows_info['margin'], dtype=float) * np.ones(size)
+        self.discount_curve = discount_curve
+        self.forward_curve = forward_curve
+        self.__cashflows = None
+        self.pv_cache = {}
+        self.evaluations = 0
+        self.skips = 0
+
+    def set_curves(self, discount_curve, forward_curve):
+        self.discount_curve = discount_curve
+        self.forward_curve = forward_curve
+        if self.__cashflows is not None:
+            for cf in self.__cashflows:
+                cf.discount_curve = discount_curve
+                cf.forward_curve = forward_curve
+
+    def set_rates(self, rate, margin):
+        self.rate = np.asarray(rate, dtype=float) * np.ones(self.start_yf.shape[0])
+        self.margin = np.asarray(margin, dtype=float) * np.ones(self.start_yf.shape[0])
+        self.__cashflows = None
+        self.pv_cache.clear()
+
+    @property
+    def cashflows(self):
+        if self.__cashflows is None:
+            start_dates = self.start_dates.astype('datetime64[us]').astype(object)
+            end_dates = self.end_dates.astype('datetime64[us]').astype(object)
+            self.__cashflows = [CashFlow(self.val_date, start_dates[i], end_dates[i], self.is_float,
+                                         self.notional[i], self.rate[i], self.margin[i],
+                                         discount_curve=self.discount_curve, forward_curve=self.forward_curve)
+                                for i in range(self.start_yf.shape[0])]
+        return self.__cashflows
+
+    def compute_rates(self):
+        if not self.is_float:
+            return self.rate
+        if not isinstance(self.forward_curve, Curve.curve):
+            raise ValueError('forward curve is not initialized for float cashflow')
+        return self.forward_curve.get_forward_rate_yf(self.start_yf, self.end_yf)
 
     def compute_leg_pv(self, include_margin=True):
-        pv = 0.
-        for cf in self.cashflows:
-            if include_margin:
-                pv += cf.compute_cashflow_pv()
-            else:
-                pv += cf.compute_cashflow_pv(False)
-        return pv
+        if np.any(self.end_yf <= 0):
+            raise ValueError('cashflow payment date is before valuation date')
+        rates = self.compute_rates()
+        if include_margin:
+            rates = rates + self.margin
+        df = self.discount_curve.get_discount_factor(self.end_yf)
+        return float(np.sum(self.notional * rates * self.accrual * df))
+
+    def compute_annuity(self, discount_curve=None):
+        if discount_curve is None:
+            discount_curve = self.discount_curve
+        df = discount_curve.get_discount_factor(self.end_yf)
+        return float(np.sum(self.notional * self.accrual * df))
+
+    def compute_leg_pv_sensitivity(self, include_margin=True, gradient=None, pv_bar=1.):
+        if gradient is None:
+            gradient = {}
+        if np.any(self.end_yf <= 0):
+            raise ValueError('cashflow payment date is before valuation date')
+        rates = self.compute_rates()
+        if include_margin:
+            rates = rates + self.margin
+        df = self.discount_curve.get_discount_factor(self.end_yf)
+        # reverse sweep, pv = sum(notional * rates * accrual * df)
+        Curve.add_gradient(gradient, self.discount_curve,
+                           self.discount_curve.get_discount_factor_adjoint(self.end_yf,
+                                                                           pv_bar * self.notional * rates * self.accrual))
+        if self.is_float:
+            Curve.add_gradient(gradient, self.forward_curve,
+                               self.forward_curve.get_forward_rate_adjoint(self.start_yf, self.end_yf,
+                                                                           pv_bar * self.notional * self.accrual * df))
+        return float(np.sum(self.notional * rates * self.accrual * df)), gradient
+
+    def compute_annuity_sensitivity(self, discount_curve=None, gradient=None, annuity_bar=1.):
+        if gradient is None:
+            gradient = {}
+        if discount_curve is None:
+            discount_curve = self.discount_curve
+        df = discount_curve.get_discount_factor(self.end_yf)
+        Curve.add_gradient(gradient, discount_curve,
+                           discount_curve.get_discount_factor_adjoint(self.end_yf,
+                                                                      annuity_bar * self.notional * self.accrual))
+        return float(np.sum(self.notional * self.accrual * df)), gradient
+
+    def __curve_state(self, annuity_curve):
+        curves = [self.discount_curve, annuity_curve]
+        if self.is_float:
+            curves.append(self.forward_curve)
+        return tuple((curve, getattr(curve, 'version', None)) for curve in curves)
+
+    def get_pv_stats(self):
+        return {'evaluations': self.evaluations, 'skips': self.skips}
+
+    def reset_pv_stats(self):
+        self.evaluations = 0
+        self.skips = 0
+
+    def compute_leg_components(self, annuity_curve=None):
+        # reprice only if the discount, annuity or forward curve moved since the last call
+        state = self.__curve_state(annuity_curve)
+        cached = self.pv_cache.get(annuity_curve)
+        if cached is not None and cached[0] == state:
+            self.skips += 1
+            return cached[1]
+        self.evaluations += 1
+        components = self.__compute_leg_components(annuity_curve)
+        self.pv_cache[annuity_curve] = (state, components)
+        return components
+
+    def __compute_leg_components(self, annuity_curve):
+        if np.any(self.end_yf <= 0):
+            raise ValueError('cashflow payment date is before valuation date')
+        rates = self.compute_rates()
+        df = self.discount_curve.get_discount_factor(self.end_yf)
+        if annuity_curve is not None and annuity_curve is not self.discount_curve:
+            annuity_df = annuity_curve.get_discount_factor(self.end_yf)
+        else:
+            annuity_df = df
+        pv = float(np.sum(self.notional * (rates + self.margin) * self.accrual * df))
+        pv_ex_margin = float(np.sum(self.notional * rates * self.accrual * df))
+        annuity = float(np.sum(self.notional * self.accrual * annuity_df))
+        return pv, pv_ex_margin, annuity
 
     def is_float_leg(self):
         return self.is_float
@@ -5,8 +5,44 @@ Author:      YANG YIFAN
 Created:     2020
 """
 
-from scipy.interpolate import interp1d
-import math
+import numpy as np
+import Interpolation
+
+def day_offset(val_date, dates):
+    '''
+    integer day offsets of date(s) from val_date, via datetime64[D]
+    :param dates: date, or array/list of dates
+    :return: int or numpy int array
+    '''
+    offsets = (np.asarray(dates, dtype='datetime64[D]') - np.datetime64(val_date, 'D')).astype(np.int64)
+    return offsets if offsets.ndim else int(offsets)
+
+def year_frac(val_date, dates):
+    '''
+    act/365 year frac of date(s) from val_date
+    '''
+    return day_offset(val_date, dates) / 365.
+
+def sensitivity_to_dense(index, weight, size):
+    '''
+    scatter sparse (index, weight) sensitivities into a dense array of shape index.shape[:-1] + (size,)
+    '''
+    index = np.asarray(index)
+    dense = np.zeros(index.shape[:-1] + (size,))
+    rows = np.broadcast_to(np.arange(int(np.prod(index.shape[:-1])))[:, None], (dense.size // size, index.shape[-1]))
+    np.add.at(dense.reshape(-1, size), (rows, index.reshape(-1, index.shape[-1])),
+              np.asarray(weight).reshape(-1, index.shape[-1]))
+    return dense
+
+def add_gradient(gradient, curve, y_bar):
+    '''
+    accumulate adjoint y_bar of curve into gradient, dict curve -> numpy array shaped like curve.y
+    '''
+    if curve in gradient:
+        gradient[curve] = gradient[curve] + y_bar
+    else:
+        gradient[curve] = y_bar
+    return gradient
 
 class curve(object):
     '''
@@ -15,55 +51,220 @@ class curve(object):
     ==========
     name : string
     val_date : date
-    x : numpy double, year frac
+    x : numpy double, year frac, pillars must be distinct
     y : numpy double, value
-    interp : scipy interp function
+    interp_scheme : string, interpolation scheme, see Interpolation.INTERPOLATION_SCHEMES
+    engine : Interpolation.interpolator, holds the sorted pillars and per-segment coefficients
+    version : int, bumped by every update that changes y, invalidates the memo cache and leg pv caches
+    cache_size : int, max number of memoized scalar queries, 0 disables the memo cache, e.g. for curves updated
+                 on every solver iteration where each update clears it
 
     Methods
     =======
     update_curve(y_new) :
         update y value
-    get_discount_factor(xval):
-        return discount factor
+    interp(xval) :
+        return interpolated zero rate, scalar or numpy array of year frac
+    get_discount_factor(xval, return_sensitivity):
+        return discount factor, scalar or numpy array of year frac, optionally with sparse d df / d y
     get_forward_rate(start_date, end_date) :
-        return forward rate
+        return forward rate, scalar dates or arrays of dates
+    get_forward_rate_yf(start_yf, end_yf, return_sensitivity) :
+        return forward rate, scalar or numpy array of year frac, optionally with sparse d fwd / d y
+    get_node_weights(xval) :
+        return sparse zero rate sensitivity to y, (index, weight)
+    get_zero_rate_adjoint(xval, zero_bar), get_discount_factor_adjoint(xval, df_bar),
+    get_forward_rate_adjoint(start_yf, end_yf, fwd_bar) :
+        reverse sweep, return y_bar = sum of output adjoint * d output / d y, shaped like y
+    get_node_support(max_yf) :
+        return bool mask over y of nodes that can move curve values up to max_yf
+    get_cache_stats() :
+        return memo cache hit/miss counters
     __init__(name, val_date, tenors) :
         initiate interest rate curve
     '''
 
-    def __init__(self, name, val_date, x, y):
+    def __init__(self, name, val_date, x, y, cache_size=0, interp_scheme='linear'):
         self.name = name
         self.val_date = val_date
         self.x = x
-        self.y = y
-        self.interp = interp1d(x, y, bounds_error=False, fill_value=(y[0], y[-1]))
+        # private copy, update() compares against it to detect unchanged y
+        self.y = np.array(y, dtype=float)
+        # memo cache of scalar queries, only valid for cache_version == version
+        self.version = 0
+        self.cache = {}
+        self.cache_size = cache_size
+        self.cache_version = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # interpolation engine works on sorted pillars, y follows the same order
+        self.interp_scheme = interp_scheme
+        self.order = np.argsort(np.asarray(x, dtype=float), kind='stable')
+        x_sorted = np.asarray(x, dtype=float)[self.order]
+        # interp1d accepted repeated pillars, the engines need one node per pillar
+        duplicates = x_sorted[1:][np.diff(x_sorted) == 0]
+        if duplicates.shape[0] > 0:
+            raise ValueError(name, 'has duplicate pillars', np.unique(duplicates))
+        self.engine = Interpolation.create_interpolator(interp_scheme, x_sorted, np.asarray(y, dtype=float)[self.order])
 
     def update(self, y_new):
         if self.y.shape[0] != y_new.shape[0]:
             raise ValueError('new discount factor size is not the same as the current curve')
-        self.y = y_new
-        self.interp = interp1d(self.x, self.y, bounds_error=False, fill_value=(y_new[0], y_new[-1]))
+        # unchanged y keeps the version, so caches keyed by version stay valid
+        if np.array_equal(self.y, y_new):
+            return
+        self.y = np.array(y_new, dtype=float)
+        self.version += 1
+        # refresh coefficients in place, called on every solver iteration
+        self.engine.update(self.y[self.order])
 
-    def get_discount_factor(self, xval):
-        return math.exp(-self.interp(xval) * xval)
+    def __cache_get(self, key):
+        if self.cache_version != self.version:
+            self.cache.clear()
+            self.cache_version = self.version
+        value = self.cache.get(key)
+        if value is None:
+            self.cache_misses += 1
+        else:
+            self.cache_hits += 1
+        return value
 
-    def get_forward_rate(self, start_date, end_date):
-        if start_date < self.val_date or end_date <= start_date:
-            raise ValueError('forward rate start date or end date is not valid')
-        df_start = self.get_discount_factor((start_date - self.val_date).days/365)
-        df_end = self.get_discount_factor((end_date - self.val_date).days/365)
-        year_frac = (end_date - start_date).days/365
-        return (df_start / df_end - 1) / year_frac
+    def __cache_put(self, key, value):
+        if len(self.cache) >= self.cache_size:
+            # drop the oldest entry, dict keeps insertion order
+            del self.cache[next(iter(self.cache))]
+        self.cache[key] = value
+        return value
 
-    def get_zero_rate(self, end_date):
-        yf_end = (end_date - self.val_date).days / 365
-        return self.interp(yf_end)
+    def get_cache_stats(self):
+        return {'hits': self.cache_hits, 'misses': self.cache_misses,
+                'size': len(self.cache), 'version': self.version}
 
-    def get_currency(self):
-        return self.name[:3]
+    def reset_cache_stats(self):
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def interp(self, xval):
+        '''
+        zero rate from the interpolation engine, flat extrapolation on both sides
+        '''
+        zero = self.engine.zero_rate(xval)
+        return zero if zero.ndim else float(zero)
+
+    def get_node_weights(self, xval):
+        '''
+        d zero_rate(xval) / d y, sparse, index refers to positions in self.y
+        :return: (index, weight), arrays of shape xval.shape + (k,)
+        '''
+        index, weight = self.engine.node_weights(np.asarray(xval, dtype=float))
+        return self.order[index], weight
+
+    def get_node_support(self, max_yf):
+        support = np.zeros(self.y.shape[0], dtype=bool)
+        support[self.order] = self.engine.node_support(max_yf)
+        return support
 
+    def get_discount_factor(self, xval, return_sensitivity=False):
+        '''
+        :param return_sensitivity: if True, also return sparse d df / d y as (index, weight)
+        :return: df, or (df, index, weight)
+        '''
+        if return_sensitivity:
+            t = np.asarray(xval, dtype=float)
+            df = np.exp(-self.engine.zero_rate(t) * t)
+            index, weight = self.get_node_weights(t)
+            weight = -(t * df)[..., None] * weight
+            return (df if df.ndim else float(df)), index, weight
+        if self.cache_size > 0 and np.ndim(xval) == 0:
+            # keyed on the float value, 0-d numpy arrays are not hashable
+            key = ('df', float(xval))
+            df = self.__cache_get(key)
+            if df is None:
+                df = self.__cache_put(key, self.__compute_discount_factor(float(xval)))
+            return df
+        return self.__compute_discount_factor(np.asarray(xval, dtype=float))
 
+    def __compute_discount_factor(self, t):
+        df = np.exp(-self.interp(t) * t)
+        return df if np.ndim(df) else float(df)
 
+    def get_forward_rate(self, start_date, end_date, return_sensitivity=False):
+        return self.get_forward_rate_yf(year_frac(self.val_date, start_date), year_frac(self.val_date, end_date),
+                                        return_sensitivity)
+
+    def get_forward_rate_yf(self, start_yf, end_yf, return_sensitivity=False):
+        '''
+        forward rate between year fracs from val_date, scalar or numpy arrays
+        :param return_sensitivity: if True, also return sparse d fwd / d y as (index, weight),
+                                   start date nodes first, then end date nodes
+        '''
+        if return_sensitivity:
+            return self.__compute_forward_rate(np.asarray(start_yf, dtype=float), np.asarray(end_yf, dtype=float),
+                                               True)
+        if self.cache_size > 0 and np.ndim(start_yf) == 0 and np.ndim(end_yf) == 0:
+            key = ('fwd', float(start_yf), float(end_yf))
+            fwd = self.__cache_get(key)
+            if fwd is None:
+                fwd = self.__cache_put(key, self.__compute_forward_rate(float(start_yf), float(end_yf)))
+            return fwd
+        return self.__compute_forward_rate(np.asarray(start_yf, dtype=float), np.asarray(end_yf, dtype=float))
+
+    def __compute_forward_rate(self, start_yf, end_yf, return_sensitivity=False):
+        if np.any(start_yf < 0) or np.any(end_yf <= start_yf):
+            raise ValueError('forward rate start date or end date is not valid')
+        if not return_sensitivity:
+            # discount factors bypass the memo cache, one forward lookup counts as one hit or miss
+            df_start = self.__compute_discount_factor(start_yf)
+            df_end = self.__compute_discount_factor(end_yf)
+            fwd = (df_start / df_end - 1) / (end_yf - start_yf)
+            return fwd if np.ndim(fwd) else float(fwd)
+        df_start, index_start, weight_start = self.get_discount_factor(start_yf, True)
+        df_end, index_end, weight_end = self.get_discount_factor(end_yf, True)
+        year_frac = end_yf - start_yf
+        fwd = (df_start / df_end - 1) / year_frac
+        # d fwd = (d df_start / df_end - df_start d df_end / df_end^2) / year_frac
+        coef_start = np.asarray(1. / (df_end * year_frac))
+        coef_end = np.asarray(-df_start / (df_end ** 2 * year_frac))
+        index = np.concatenate([index_start, index_end], axis=-1)
+        weight = np.concatenate([coef_start[..., None] * weight_start, coef_end[..., None] * weight_end], axis=-1)
+        return (fwd if np.ndim(fwd) else float(fwd)), index, weight
 
+    def get_zero_rate(self, end_date, return_sensitivity=False):
+        return self.get_zero_rate_yf(year_frac(self.val_date, end_date), return_sensitivity)
 
+    def get_zero_rate_yf(self, end_yf, return_sensitivity=False):
+        if return_sensitivity:
+            index, weight = self.get_node_weights(end_yf)
+            return self.interp(end_yf), index, weight
+        return self.interp(end_yf)
 
+    def get_zero_rate_adjoint(self, xval, zero_bar):
+        t = np.asarray(xval, dtype=float)
+        index, weight = self.get_node_weights(t)
+        weight = np.broadcast_to(np.asarray(zero_bar, dtype=float), t.shape)[..., None] * weight
+        return np.bincount(index.ravel(), weight.ravel(), self.y.shape[0])
+
+    def get_discount_factor_adjoint(self, xval, df_bar):
+        t = np.asarray(xval, dtype=float)
+        df = np.exp(-self.engine.zero_rate(t) * t)
+        # df = exp(-zero * t)  =>  zero_bar = -t * df * df_bar
+        return self.get_zero_rate_adjoint(t, -t * df * df_bar)
+
+    def get_forward_rate_adjoint(self, start_yf, end_yf, fwd_bar):
+        start_yf, end_yf, fwd_bar = np.broadcast_arrays(np.asarray(start_yf, dtype=float),
+                                                        np.asarray(end_yf, dtype=float),
+                                                        np.asarray(fwd_bar, dtype=float))
+        if np.any(start_yf < 0) or np.any(end_yf <= start_yf):
+            raise ValueError('forward rate start date or end date is not valid')
+        df_start = np.exp(-self.engine.zero_rate(start_yf) * start_yf)
+        df_end = np.exp(-self.engine.zero_rate(end_yf) * end_yf)
+        year_frac = end_yf - start_yf
+        # fwd = (df_start / df_end - 1) / year_frac
+        df_start_bar = fwd_bar / (df_end * year_frac)
+        df_end_bar = -fwd_bar * df_start / (df_end ** 2 * year_frac)
+        t = np.concatenate([np.ravel(start_yf), np.ravel(end_yf)])
+        df_bar = np.concatenate([np.ravel(df_start_bar), np.ravel(df_end_bar)])
+        return self.get_discount_factor_adjoint(t, df_bar)
+
+    def get_currency(self):
+        return self.name[:3]
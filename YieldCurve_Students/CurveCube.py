@@ -0,0 +1,281 @@
+"""
+Name:   Curve cube store
+Description: appendable time series store of calibrated curves, one set of raw binary files per curve,
+             rows are valuation dates, columns are curve pillars, curvecube queries all dates at once
+Created:     2026
+"""
+
+import numpy as np
+import json
+import os
+import Interpolation
+import Curve
+
+# per curve files in the store directory, <curve name><suffix>
+HEADER_SUFFIX = '.json'
+DATES_SUFFIX = '.dates'
+X_SUFFIX = '.x'
+Y_SUFFIX = '.y'
+
+def curve_file_pathname(store_dir, curve_name, suffix):
+    return os.path.join(store_dir, curve_name + suffix)
+
+def read_header(store_dir, curve_name):
+    '''
+    :return: dict with name, interp_scheme, size (number of pillars)
+    '''
+    header_pathname = curve_file_pathname(store_dir, curve_name, HEADER_SUFFIX)
+    if not os.path.exists(header_pathname):
+        raise ValueError(curve_name, 'is not found in curve cube store', store_dir)
+    with open(header_pathname) as f:
+        return json.load(f)
+
+def stored_rows(store_dir, curve_name, size):
+    '''
+    number of complete rows, rows of a partially written append are not counted
+    '''
+    rows = os.path.getsize(curve_file_pathname(store_dir, curve_name, DATES_SUFFIX)) // 8
+    for suffix in (X_SUFFIX, Y_SUFFIX):
+        rows = min(rows, os.path.getsize(curve_file_pathname(store_dir, curve_name, suffix)) // (8 * size))
+    return rows
+
+def append_curves(store_dir, curves):
+    '''
+    append one row per curve, the curve val_date, pillars in year frac and zero rates
+    x and y are written before the dates file, a row is complete once its date is written,
+    files are truncated to the complete rows first so a partial append is not paired with later rows
+    :param curves: dict<curve_name, curve>, pillar count and interp scheme must match the stored curve
+    '''
+    if not os.path.exists(store_dir):
+        os.makedirs(store_dir)
+    for name, curve in curves.items():
+        size = curve.y.shape[0]
+        header_pathname = curve_file_pathname(store_dir, name, HEADER_SUFFIX)
+        if os.path.exists(header_pathname):
+            header = read_header(store_dir, name)
+            if header['size'] != size or header['interp_scheme'] != curve.interp_scheme:
+                raise ValueError(name, 'pillars or interp scheme are not the same as the curve cube store')
+            rows = stored_rows(store_dir, name, size)
+            for suffix, row_bytes in ((DATES_SUFFIX, 8), (X_SUFFIX, 8 * size), (Y_SUFFIX, 8 * size)):
+                pathname = curve_file_pathname(store_dir, name, suffix)
+                if os.path.getsize(pathname) > rows * row_bytes:
+                    os.truncate(pathname, rows * row_bytes)
+        else:
+            for suffix in (DATES_SUFFIX, X_SUFFIX, Y_SUFFIX):
+                open(curve_file_pathname(store_dir, name, suffix), 'wb').close()
+            with open(header_pathname, 'w') as f:
+                json.dump({'name': name, 'interp_scheme': curve.interp_scheme, 'size': size}, f)
+        with open(curve_file_pathname(store_dir, name, X_SUFFIX), 'ab') as f:
+            f.write(np.asarray(curve.x, dtype=np.float64).tobytes())
+        with open(curve_file_pathname(store_dir, name, Y_SUFFIX), 'ab') as f:
+            f.write(np.asarray(curve.y, dtype=np.float64).tobytes())
+        with open(curve_file_pathname(store_dir, name, DATES_SUFFIX), 'ab') as f:
+            f.write(np.array([np.datetime64(curve.val_date, 'D')]).astype('datetime64[D]').tobytes())
+
+def read_curve_history(store_dir, curve_name):
+    '''
+    memory mapped, read only views of the stored rows
+    :return: dates (datetime64[D]), x (dates x pillars), y (dates x pillars), interp scheme
+    '''
+    header = read_header(store_dir, curve_name)
+    size = header['size']
+    dates_pathname = curve_file_pathname(store_dir, curve_name, DATES_SUFFIX)
+    rows = stored_rows(store_dir, curve_name, size)
+    if rows == 0:
+        return np.zeros(0, dtype='datetime64[D]'), np.zeros((0, size)), np.zeros((0, size)), header['interp_scheme']
+    dates = np.memmap(dates_pathname, dtype='datetime64[D]', mode='r', shape=(rows,))
+    x = np.memmap(curve_file_pathname(store_dir, curve_name, X_SUFFIX), dtype=np.float64, mode='r',
+                  shape=(rows, size))
+    y = np.memmap(curve_file_pathname(store_dir, curve_name, Y_SUFFIX), dtype=np.float64, mode='r',
+                  shape=(rows, size))
+    return dates, x, y, header['interp_scheme']
+
+def read_curve_on_date(store_dir, curve_name, val_date):
+    '''
+    :return: x, y, interp scheme of the last row stored for val_date
+    '''
+    dates, x, y, interp_scheme = read_curve_history(store_dir, curve_name)
+    rows = np.flatnonzero(dates == np.datetime64(val_date, 'D'))
+    if rows.shape[0] == 0:
+        raise ValueError(curve_name, 'is not found in curve cube store on', val_date)
+    return np.array(x[rows[-1]]), np.array(y[rows[-1]]), interp_scheme
+
+def load_curve_cube(store_dir, curve_name):
+    '''
+    :return: curvecube on the memory mapped rows of the store
+    '''
+    dates, x, y, interp_scheme = read_curve_history(store_dir, curve_name)
+    return curvecube(curve_name, dates, x, y, interp_scheme)
+
+class curvecube(object):
+    '''
+    time series of one curve, dates x pillars, each row interpolated as Curve.curve with the same scheme
+    queries take year fracs t of shape (k,), same for every date, or (dates, k), one row per date,
+    and return (dates, k) matrices
+    Attributes
+    ==========
+    name : string
+    interp_scheme : string, see Interpolation.INTERPOLATION_SCHEMES
+    dates : numpy datetime64[D], valuation date of each row
+    x : numpy double (dates x pillars), pillars in year frac from each row date, sorted
+    y : numpy double (dates x pillars), zero rates at pillars
+
+    Methods
+    =======
+    get_zero_rate(t) :
+        return zero rates
+    get_discount_factor(t) :
+        return discount factors
+    get_forward_rate_yf(start_yf, end_yf) :
+        return forward rates
+    get_year_frac(dates) :
+        return act/365 year frac of calendar dates from every row date, (dates, k)
+    get_curve(i) :
+        return Curve.curve of row i
+    '''
+
+    def __init__(self, name, dates, x, y, interp_scheme='linear'):
+        if interp_scheme not in Interpolation.INTERPOLATION_SCHEMES:
+            raise ValueError(interp_scheme, 'is not a supported interpolation scheme')
+        self.name = name
+        self.interp_scheme = interp_scheme
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        self.x = x
+        self.y = y
+        # rows of the store are kept as memory mapped views unless pillars need sorting
+        if x.shape[0] > 0 and np.any(np.diff(x, axis=1) <= 0):
+            order = np.argsort(x, axis=1, kind='stable')
+            self.x = np.take_along_axis(np.asarray(x), order, axis=1)
+            self.y = np.take_along_axis(np.asarray(y), order, axis=1)
+        self.__coefficients = None
+
+    def __get_coefficients(self):
+        '''
+        per date coefficients (dates x segments or knots), built on the first query and reused
+        linear: slope of the zero rate, loglinear: r * t and its slope, cubic: second derivatives M,
+        monotoneconvex: knots, r * t, discrete and instantaneous forwards, rows without a pillar at 0 start from 0,
+        rows with one are padded with a knot after the last pillar, flat extrapolation covers it
+        one pillar curves keep one interpolation engine per date
+        '''
+        if self.__coefficients is None:
+            dx = np.diff(self.x, axis=1)
+            if self.x.shape[1] < 2:
+                self.__coefficients = {'engines': [Interpolation.create_interpolator(self.interp_scheme, self.x[i],
+                                                                                     self.y[i])
+                                                   for i in range(self.dates.shape[0])]}
+            elif self.interp_scheme == 'linear':
+                self.__coefficients = {'slope': np.diff(self.y, axis=1) / dx}
+            elif self.interp_scheme == 'loglinear':
+                rt = self.y * self.x
+                self.__coefficients = {'rt': rt, 'slope': np.diff(rt, axis=1) / dx}
+            else:
+                # non local schemes, coefficients from one interpolation engine per date, built once
+                engines = [Interpolation.create_interpolator(self.interp_scheme, self.x[i], self.y[i])
+                           for i in range(self.dates.shape[0])]
+                if self.interp_scheme == 'cubic':
+                    self.__coefficients = {'dx': dx, 'M': np.array([engine.M for engine in engines])}
+                else:
+                    self.__coefficients = {}
+                    for key in ('t', 'h', 'rt', 'fd', 'f'):
+                        rows = [getattr(engine, key) for engine in engines]
+                        size = max(row.shape[0] for row in rows)
+                        padded = np.empty((len(rows), size))
+                        for i, row in enumerate(rows):
+                            padded[i, :row.shape[0]] = row
+                            if row.shape[0] < size:
+                                padded[i, row.shape[0]:] = row[-1] + 1. if key == 't' else row[-1]
+                        self.__coefficients[key] = padded
+        return self.__coefficients
+
+    def __query(self, t):
+        t = np.asarray(t, dtype=float)
+        if t.ndim == 0:
+            t = t[None]
+        return np.broadcast_to(t, (self.dates.shape[0], t.shape[-1]))
+
+    def __segment(self, knots, t):
+        '''
+        segment of each query, as Interpolation.interpolator.segment on every row, by one searchsorted call
+        knots are replaced by their rank among the distinct knot values and queries by the number of distinct
+        values below them, x < t exactly when rank(x) < rank(t), each row is shifted by row * number of values
+        so rows do not overlap in the flattened keys
+        :param knots: dates x knots, sorted rows, the pillars or the monotone convex knots
+        '''
+        dates_size, size = knots.shape
+        values, x_rank = np.unique(knots, return_inverse=True)
+        shift = np.arange(dates_size, dtype=np.int64)[:, None] * (values.shape[0] + 1)
+        x_keys = x_rank.reshape(dates_size, size) + shift
+        if t.strides[0] == 0:
+            # same queries for every date, ranked once
+            t_keys = np.searchsorted(values, t[0])[None, :] + shift
+        else:
+            t_keys = np.searchsorted(values, t) + shift
+        position = np.searchsorted(x_keys.ravel(), t_keys) - np.arange(dates_size)[:, None] * size
+        return np.clip(position - 1, 0, size - 2)
+
+    def get_zero_rate(self, t):
+        t = self.__query(t)
+        coefficients = self.__get_coefficients()
+        if self.x.shape[1] < 2:
+            return np.array([engine.zero_rate(t[i])
+                             for i, engine in enumerate(coefficients['engines'])]).reshape(t.shape)
+        if self.interp_scheme == 'monotoneconvex':
+            return self.__monotoneconvex_zero_rate(t, coefficients)
+        idx = self.__segment(self.x, t)
+        x_left = np.take_along_axis(self.x, idx, axis=1)
+        if self.interp_scheme == 'loglinear':
+            inside = (t >= self.x[:, :1]) & (t <= self.x[:, -1:]) & (t > 0)
+            t_safe = np.where(inside, t, 1.)
+            zero = (np.take_along_axis(coefficients['slope'], idx, axis=1) * (t_safe - x_left)
+                    + np.take_along_axis(coefficients['rt'], idx, axis=1)) / t_safe
+        elif self.interp_scheme == 'cubic':
+            # natural cubic spline, same terms as Interpolation.naturalcubic.zero_rate
+            h = np.take_along_axis(coefficients['dx'], idx, axis=1)
+            b = np.clip((t - x_left) / h, 0., 1.)
+            a = 1. - b
+            zero = a * np.take_along_axis(self.y, idx, axis=1) + b * np.take_along_axis(self.y, idx + 1, axis=1) \
+                + (a ** 3 - a) * h ** 2 / 6. * np.take_along_axis(coefficients['M'], idx, axis=1) \
+                + (b ** 3 - b) * h ** 2 / 6. * np.take_along_axis(coefficients['M'], idx + 1, axis=1)
+        else:
+            zero = np.take_along_axis(coefficients['slope'], idx, axis=1) * (t - x_left) \
+                + np.take_along_axis(self.y, idx, axis=1)
+        zero = np.where(t < self.x[:, :1], self.y[:, :1], zero)
+        return np.where(t > self.x[:, -1:], self.y[:, -1:], zero)
+
+    def __monotoneconvex_zero_rate(self, t, coefficients):
+        # same terms as Interpolation.monotoneconvex.zero_rate, on the per date knots
+        idx = self.__segment(coefficients['t'], t)
+        h = np.take_along_axis(coefficients['h'], idx, axis=1)
+        x = np.clip((t - np.take_along_axis(coefficients['t'], idx, axis=1)) / h, 0., 1.)
+        fd = np.take_along_axis(coefficients['fd'], idx, axis=1)
+        g0 = np.take_along_axis(coefficients['f'], idx, axis=1) - fd
+        g0 = np.where(np.abs(g0) < 1e-15, 0., g0)
+        g1 = np.take_along_axis(coefficients['f'], idx + 1, axis=1) - fd
+        g1 = np.where(np.abs(g1) < 1e-15, 0., g1)
+        rt = np.take_along_axis(coefficients['rt'], idx, axis=1) + fd * h * x \
+            + h * Interpolation.monotoneconvex.integral(g0, g1, x)
+        positive = t > 0.
+        zero = np.where(positive, rt / np.where(positive, t, 1.), coefficients['f'][:, :1])
+        return np.where(t > self.x[:, -1:], self.y[:, -1:], zero)
+
+    def get_discount_factor(self, t):
+        t = self.__query(t)
+        return np.exp(-self.get_zero_rate(t) * t)
+
+    def get_forward_rate_yf(self, start_yf, end_yf):
+        start_yf = self.__query(start_yf)
+        end_yf = self.__query(end_yf)
+        if np.any(start_yf < 0) or np.any(end_yf <= start_yf):
+            raise ValueError('forward rate start date or end date is not valid')
+        df_start = self.get_discount_factor(start_yf)
+        df_end = self.get_discount_factor(end_yf)
+        return (df_start / df_end - 1) / (end_yf - start_yf)
+
+    def get_year_frac(self, dates):
+        days = np.asarray(dates, dtype='datetime64[D]').reshape(-1)[None, :] - self.dates[:, None]
+        return days.astype(np.int64) / 365.
+
+    def get_curve(self, i):
+        val_date = self.dates[i].astype(object)
+        return Curve.curve(self.name, val_date, np.array(self.x[i]), np.array(self.y[i]),
+                           interp_scheme=self.interp_scheme)
@@ -6,6 +6,7 @@ Created:     2021
 """
 
 import dateutil.relativedelta as relativedelta
+import Curve
 
 class fra(object):
     '''
@@ -26,6 +27,10 @@ class fra(object):
         compute mtm of future
     compute_target_rate():
         compute implied target rate
+    compute_target_rate_sensitivity():
+        return (target rate, gradient), gradient is dict curve -> d target / d curve.y
+    get_curves():
+        return curves the target rate is priced on
     '''
 
     def __init__(self, val_date, start_tenor, end_tenor, target_rate, notional=1.,
@@ -55,12 +60,24 @@ class fra(object):
         else:
             self.start_date = self.val_date + relativedelta.relativedelta(months=start_tenor_length)
         self.end_date = self.start_date + relativedelta.relativedelta(months=fra_length)
+        self.start_yf = Curve.year_frac(self.val_date, self.start_date)
+        self.end_yf = Curve.year_frac(self.val_date, self.end_date)
 
     def compute_target_rate(self):
-        return self.forward_curve.get_forward_rate(self.start_date, self.end_date)
+        return self.forward_curve.get_forward_rate_yf(self.start_yf, self.end_yf)
+
+    def compute_target_rate_sensitivity(self, gradient=None):
+        if gradient is None:
+            gradient = {}
+        Curve.add_gradient(gradient, self.forward_curve,
+                           self.forward_curve.get_forward_rate_adjoint(self.start_yf, self.end_yf, 1.))
+        return self.compute_target_rate(), gradient
+
+    def get_curves(self):
+        return [self.forward_curve]
 
     def get_maturity(self):
-        return (self.end_date - self.val_date).days / 365.
+        return self.end_yf
 
 
 
@@ -6,6 +6,7 @@ Created:     2021
 """
 
 import dateutil.relativedelta as relativedelta
+import Curve
 import math
 import pandas as pd
 import pdb
@@ -28,6 +29,10 @@ class fxforward(object):
     =======
     compute_target_rate():
         compute implied target rate
+    compute_target_rate_sensitivity():
+        return (target rate, gradient), gradient is dict curve -> d target / d curve.y
+    get_curves():
+        return curves the target rate is priced on
     __init__(self, val_date, tenor, fx_spot, market_quote, dom_curve, for_curve,
                  for_notional=1., is_direct_quote=True):
         initiate fxforward, market quote is fx forward
@@ -51,17 +56,28 @@ class fxforward(object):
             raise ValueError('fx forward tenor is not defined in month unit')
         tenor_length = int(self.tenor[0:-1])
         self.maturity_date = self.val_date + relativedelta.relativedelta(months=tenor_length)
+        self.maturity_yf = Curve.year_frac(self.val_date, self.maturity_date)
 
     def compute_target_rate(self):
-        for_rate = self.for_curve.get_zero_rate(self.maturity_date)
-        dom_rate = self.dom_curve.get_zero_rate(self.maturity_date)
+        for_rate = self.for_curve.get_zero_rate_yf(self.maturity_yf)
+        dom_rate = self.dom_curve.get_zero_rate_yf(self.maturity_yf)
         return dom_rate - for_rate
 
+    def compute_target_rate_sensitivity(self, gradient=None):
+        if gradient is None:
+            gradient = {}
+        Curve.add_gradient(gradient, self.dom_curve, self.dom_curve.get_zero_rate_adjoint(self.maturity_yf, 1.))
+        Curve.add_gradient(gradient, self.for_curve, self.for_curve.get_zero_rate_adjoint(self.maturity_yf, -1.))
+        return self.compute_target_rate(), gradient
+
+    def get_curves(self):
+        return [self.dom_curve, self.for_curve]
+
     def get_maturity(self):
-        return (self.maturity_date - self.val_date).days / 365.
+        return self.maturity_yf
 
     def convert_marketquote_to_target(self):
-        year_frac = (self.maturity_date - self.val_date).days / 365
+        year_frac = self.maturity_yf
         if self.is_direct_quote:
             return 1 / year_frac * math.log(self.fx_forward / self.fx_spot)
         else:
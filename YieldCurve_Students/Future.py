@@ -6,6 +6,8 @@ Created:     2020
 """
 
 import dateutil.relativedelta as relativedelta
+import Curve
+import numpy as np
 import pandas as pd
 import pdb
 
@@ -29,6 +31,10 @@ class future(object):
         compute mtm of future
     compute_target_rate():
         compute implied target rate
+    compute_target_rate_sensitivity():
+        return (target rate, gradient), gradient is dict curve -> d target / d curve.y
+    get_curves():
+        return curves the target rate is priced on
     __init__(val_date, tenor, leg1_freq, leg2_freq, is_basis_swap, target_rate, notional,
     leg1_discount_curve, leg1_forward_curve, leg2_discount_curve, leg2_forward_curve) :
         initiate swap
@@ -59,24 +65,35 @@ class future(object):
         future_length = int(self.future_tenor[0:-1])
         self.start_date = self.val_date + relativedelta.relativedelta(months=start_tenor_length)
         self.end_date = self.start_date + relativedelta.relativedelta(months=future_length)
+        self.start_day = Curve.day_offset(self.val_date, self.start_date)
+        self.end_day = Curve.day_offset(self.val_date, self.end_date)
 
     def compute_target_rate(self):
         if not self.is_fedfuture:
-            return self.forward_curve.get_forward_rate(self.start_date, self.end_date)
-        current_date = self.start_date
-        next_day = current_date + relativedelta.relativedelta(days=1)
-        rate = 0.
-        number_of_days = 1
-        while next_day <= self.end_date:
-            rate += self.forward_curve.get_forward_rate(current_date, next_day)
-            current_date = next_day
-            number_of_days += 1
-            next_day = next_day + relativedelta.relativedelta(days=1)
-        rate = rate / number_of_days
-        return rate
+            return self.forward_curve.get_forward_rate_yf(self.start_day / 365., self.end_day / 365.)
+        # daily forwards over the whole day grid in one curve call, averaged by number of days + 1
+        days = np.arange(self.start_day, self.end_day)
+        rates = self.forward_curve.get_forward_rate_yf(days / 365., (days + 1) / 365.)
+        return float(np.sum(rates)) / (days.shape[0] + 1)
+
+    def compute_target_rate_sensitivity(self, gradient=None):
+        if gradient is None:
+            gradient = {}
+        if not self.is_fedfuture:
+            y_bar = self.forward_curve.get_forward_rate_adjoint(self.start_day / 365., self.end_day / 365., 1.)
+        else:
+            # daily forwards averaged as in compute_target_rate
+            days = np.arange(self.start_day, self.end_day)
+            y_bar = self.forward_curve.get_forward_rate_adjoint(days / 365., (days + 1) / 365.,
+                                                                1. / (days.shape[0] + 1))
+        Curve.add_gradient(gradient, self.forward_curve, y_bar)
+        return self.compute_target_rate(), gradient
+
+    def get_curves(self):
+        return [self.forward_curve]
 
     def get_maturity(self):
-        return (self.end_date - self.val_date).days / 365.
+        return self.end_day / 365.
 
 
 
@@ -0,0 +1,311 @@
+"""
+Name:   Interpolation engines
+Description: zero rate interpolation schemes for Curve, coefficients are precomputed per segment
+             and batched queries are evaluated with np.searchsorted
+Created:     2026
+"""
+
+import numpy as np
+import abc
+
+class interpolator(abc.ABC):
+    '''
+    interpolation engine abstract base class, nodes are zero rates at sorted pillars
+    Attributes
+    ==========
+    scheme : string, scheme name used by Curve and Calibration
+    x : numpy double, sorted pillars in year frac
+    y : numpy double, zero rate at pillars
+
+    Methods
+    =======
+    update(y_new) :
+        refresh coefficients in place for new node values
+    zero_rate(t) :
+        return zero rate, numpy array of year frac
+    node_weights(t) :
+        return (index, weight), d zero_rate(t) / d y[index], arrays of shape t.shape + (k,)
+    node_support(t_max) :
+        return bool mask of nodes that can move zero_rate(t) for 0 <= t <= t_max
+    '''
+    scheme = ''
+    # local schemes only depend on the 2 nodes around t, non local schemes on every node
+    local = False
+
+    def __init__(self, x, y):
+        self.x = np.array(x, dtype=float)
+        if self.x.shape[0] == 0 or np.any(np.diff(self.x) <= 0):
+            raise ValueError('interpolation pillars must be non empty and strictly increasing')
+        self.dx = np.diff(self.x)
+        self.y = np.zeros(self.x.shape[0])
+        self.build()
+        self.update(y)
+
+    def build(self):
+        pass
+
+    def update(self, y_new):
+        self.y[:] = y_new
+
+    def node_support(self, t_max):
+        if not self.local:
+            return np.ones(self.x.shape[0], dtype=bool)
+        last = min(int(np.searchsorted(self.x, t_max, side='left')), self.x.shape[0] - 1)
+        return np.arange(self.x.shape[0]) <= last
+
+    def segment(self, t):
+        '''
+        segment index of each query, clipped to the first/last segment
+        '''
+        return np.clip(np.searchsorted(self.x, t) - 1, 0, max(self.x.shape[0] - 2, 0))
+
+    def flat_extrapolate(self, t, zero):
+        zero = np.where(t < self.x[0], self.y[0], zero)
+        return np.where(t > self.x[-1], self.y[-1], zero)
+
+    @abc.abstractmethod
+    def zero_rate(self, t):
+        pass
+
+    def node_weights(self, t):
+        '''
+        numeric node sensitivity, one vectorized evaluation per bumped node
+        '''
+        t = np.asarray(t, dtype=float)
+        n = self.x.shape[0]
+        y_base = self.y.copy()
+        bump = 1e-7
+        weight = np.zeros(t.shape + (n,))
+        for j in range(n):
+            y_bump = y_base.copy()
+            y_bump[j] += bump
+            self.update(y_bump)
+            z_up = self.zero_rate(t)
+            y_bump[j] -= 2 * bump
+            self.update(y_bump)
+            weight[..., j] = (z_up - self.zero_rate(t)) / (2 * bump)
+        self.update(y_base)
+        index = np.broadcast_to(np.arange(n), weight.shape)
+        return index, weight
+
+class linearzero(interpolator):
+    '''
+    linear interpolation on zero rate, flat extrapolation, each query depends on 2 nodes
+    '''
+    scheme = 'linear'
+    local = True
+
+    def build(self):
+        self.slope = np.zeros(max(self.x.shape[0] - 1, 1))
+
+    def update(self, y_new):
+        self.y[:] = y_new
+        if self.x.shape[0] > 1:
+            np.subtract(self.y[1:], self.y[:-1], out=self.slope)
+            np.divide(self.slope, self.dx, out=self.slope)
+
+    def zero_rate(self, t):
+        t = np.asarray(t, dtype=float)
+        idx = self.segment(t)
+        return self.flat_extrapolate(t, self.slope[idx] * (t - self.x[idx]) + self.y[idx])
+
+    def node_weights(self, t):
+        t = np.asarray(t, dtype=float)
+        idx = self.segment(t)
+        if self.x.shape[0] > 1:
+            w = np.clip((t - self.x[idx]) / self.dx[idx], 0., 1.)
+        else:
+            w = np.zeros(t.shape)
+        index = np.stack([idx, np.minimum(idx + 1, self.x.shape[0] - 1)], axis=-1)
+        weight = np.stack([1. - w, w], axis=-1)
+        return index, weight
+
+class loglineardf(interpolator):
+    '''
+    linear interpolation on log discount factor (r*t), i.e. piecewise flat forward between pillars,
+    flat zero rate extrapolation, each query depends on 2 nodes
+    '''
+    scheme = 'loglinear'
+    local = True
+
+    def build(self):
+        self.rt = np.zeros(self.x.shape[0])
+        self.slope = np.zeros(max(self.x.shape[0] - 1, 1))
+
+    def update(self, y_new):
+        self.y[:] = y_new
+        np.multiply(self.y, self.x, out=self.rt)
+        if self.x.shape[0] > 1:
+            np.subtract(self.rt[1:], self.rt[:-1], out=self.slope)
+            np.divide(self.slope, self.dx, out=self.slope)
+
+    def zero_rate(self, t):
+        t = np.asarray(t, dtype=float)
+        idx = self.segment(t)
+        inside = (t >= self.x[0]) & (t <= self.x[-1]) & (t > 0)
+        t_safe = np.where(inside, t, 1.)
+        zero = (self.slope[idx] * (t_safe - self.x[idx]) + self.rt[idx]) / t_safe
+        return self.flat_extrapolate(t, zero)
+
+    def node_weights(self, t):
+        t = np.asarray(t, dtype=float)
+        idx = self.segment(t)
+        idx_next = np.minimum(idx + 1, self.x.shape[0] - 1)
+        inside = (t >= self.x[0]) & (t <= self.x[-1]) & (t > 0)
+        t_safe = np.where(inside, t, 1.)
+        if self.x.shape[0] > 1:
+            w = (t_safe - self.x[idx]) / self.dx[idx]
+        else:
+            w = np.zeros(t.shape)
+        w_lo = np.where(inside, (1. - w) * self.x[idx] / t_safe, 0.)
+        w_hi = np.where(inside, w * self.x[idx_next] / t_safe, 0.)
+        w_lo = np.where(t < self.x[0], 1., w_lo)
+        w_hi = np.where(t > self.x[-1], 1., w_hi)
+        if self.x.shape[0] == 1:
+            w_lo, w_hi = np.ones(t.shape), np.zeros(t.shape)
+        return np.stack([idx, idx_next], axis=-1), np.stack([w_lo, w_hi], axis=-1)
+
+class naturalcubic(interpolator):
+    '''
+    natural cubic spline on zero rate, flat extrapolation
+    second derivatives are linear in y, M = C y, C is built once from the pillars
+    '''
+    scheme = 'cubic'
+
+    def build(self):
+        n = self.x.shape[0]
+        self.C = np.zeros((n, n))
+        if n > 2:
+            h = self.dx
+            A = np.diag(2. * (h[:-1] + h[1:]))
+            A += np.diag(h[1:-1], 1) + np.diag(h[1:-1], -1)
+            D = np.zeros((n - 2, n))
+            rows = np.arange(n - 2)
+            D[rows, rows] = 6. / h[:-1]
+            D[rows, rows + 1] = -6. / h[:-1] - 6. / h[1:]
+            D[rows, rows + 2] = 6. / h[1:]
+            self.C[1:-1] = np.linalg.solve(A, D)
+        self.M = np.zeros(n)
+
+    def update(self, y_new):
+        self.y[:] = y_new
+        np.dot(self.C, self.y, out=self.M)
+
+    def basis(self, t):
+        idx = self.segment(t)
+        if self.x.shape[0] == 1:
+            zeros = np.zeros(t.shape)
+            return idx, np.ones(t.shape), zeros, zeros, zeros
+        h = self.dx[idx]
+        b = np.clip((t - self.x[idx]) / h, 0., 1.)
+        a = 1. - b
+        return idx, a, b, (a ** 3 - a) * h ** 2 / 6., (b ** 3 - b) * h ** 2 / 6.
+
+    def zero_rate(self, t):
+        t = np.asarray(t, dtype=float)
+        idx, a, b, c, d = self.basis(t)
+        idx_next = np.minimum(idx + 1, self.x.shape[0] - 1)
+        zero = a * self.y[idx] + b * self.y[idx_next] + c * self.M[idx] + d * self.M[idx_next]
+        return self.flat_extrapolate(t, zero)
+
+    def node_weights(self, t):
+        t = np.asarray(t, dtype=float)
+        n = self.x.shape[0]
+        idx, a, b, c, d = self.basis(t)
+        idx_next = np.minimum(idx + 1, n - 1)
+        weight = c[..., None] * self.C[idx] + d[..., None] * self.C[idx_next]
+        np.add.at(weight.reshape(-1, n), (np.arange(t.size), idx.ravel()), a.ravel())
+        np.add.at(weight.reshape(-1, n), (np.arange(t.size), idx_next.ravel()), b.ravel())
+        index = np.broadcast_to(np.arange(n), weight.shape)
+        return index, weight
+
+class monotoneconvex(interpolator):
+    '''
+    Hagan-West monotone convex interpolation of instantaneous forward, zero rate reproduced at pillars
+    the first segment starts from t=0, flat zero rate extrapolation beyond the last pillar
+    node_weights uses the numeric bump in the base class since the scheme is not linear in y
+    '''
+    scheme = 'monotoneconvex'
+
+    def build(self):
+        # knots t_0=0, t_1..t_n are the pillars, a pillar at 0 is used as t_0 itself
+        self.has_origin = self.x[0] <= 0.
+        self.t = self.x if self.has_origin else np.concatenate([[0.], self.x])
+        self.h = np.diff(self.t)
+        self.rt = np.zeros(self.t.shape[0])
+        self.fd = np.zeros(self.h.shape[0])
+        self.f = np.zeros(self.t.shape[0])
+
+    def update(self, y_new):
+        self.y[:] = y_new
+        if self.has_origin:
+            self.rt[:] = self.y * self.x
+        else:
+            self.rt[1:] = self.y * self.x
+        if self.h.shape[0] == 0:
+            self.f[:] = self.y[0]
+            return
+        np.divide(np.diff(self.rt), self.h, out=self.fd)
+        if self.h.shape[0] == 1:
+            self.f[:] = self.fd[0]
+            return
+        t = self.t
+        self.f[1:-1] = ((t[1:-1] - t[:-2]) * self.fd[1:] + (t[2:] - t[1:-1]) * self.fd[:-1]) / (t[2:] - t[:-2])
+        self.f[0] = self.fd[0] - 0.5 * (self.f[1] - self.fd[0])
+        self.f[-1] = self.fd[-1] - 0.5 * (self.f[-2] - self.fd[-1])
+
+    @staticmethod
+    def integral(g0, g1, x):
+        '''
+        integral of g over [0, x] on each segment, g = f - fd is the monotone convex correction
+        '''
+        with np.errstate(divide='ignore', invalid='ignore'):
+            zero = (g0 == 0.) & (g1 == 0.)
+            region1 = ((g0 < 0.) & (-0.5 * g0 <= g1) & (g1 <= -2. * g0)) | \
+                      ((g0 > 0.) & (-0.5 * g0 >= g1) & (g1 >= -2. * g0))
+            region2 = ((g0 < 0.) & (g1 > -2. * g0)) | ((g0 > 0.) & (g1 < -2. * g0))
+            region3 = ((g0 > 0.) & (0. > g1) & (g1 > -0.5 * g0)) | ((g0 < 0.) & (0. < g1) & (g1 < -0.5 * g0))
+            # region1, quadratic
+            G1 = g0 * (x - 2. * x ** 2 + x ** 3) + g1 * (x ** 3 - x ** 2)
+            # region2, flat then quadratic
+            eta2 = (g1 + 2. * g0) / (g1 - g0)
+            G2 = g0 * x + np.where(x > eta2, (g1 - g0) * (x - eta2) ** 3 / (3. * (1. - eta2) ** 2), 0.)
+            # region3, quadratic then flat
+            eta3 = 3. * g1 / (g1 - g0)
+            G3 = g1 * x + (g0 - g1) * eta3 / 3. * np.where(x < eta3, 1. - ((eta3 - x) / eta3) ** 3, 1.)
+            # region4, two quadratics meeting at A
+            eta4 = g1 / (g1 + g0)
+            A4 = -g0 * g1 / (g0 + g1)
+            G4 = A4 * x + (g0 - A4) * eta4 / 3. * np.where(x < eta4, 1. - ((eta4 - x) / eta4) ** 3, 1.) \
+                 + np.where(x > eta4, (g1 - A4) * (x - eta4) ** 3 / (3. * (1. - eta4) ** 2), 0.)
+            return np.select([zero, region1, region2, region3], [0. * x, G1, G2, G3], G4)
+
+    def zero_rate(self, t):
+        t = np.asarray(t, dtype=float)
+        if self.h.shape[0] == 0:
+            return np.full(t.shape, self.y[0])
+        idx = np.clip(np.searchsorted(self.t, t) - 1, 0, self.h.shape[0] - 1)
+        x = np.clip((t - self.t[idx]) / self.h[idx], 0., 1.)
+        # round-off level corrections are treated as zero to keep the region tests stable
+        g0 = self.f[idx] - self.fd[idx]
+        g0 = np.where(np.abs(g0) < 1e-15, 0., g0)
+        g1 = self.f[idx + 1] - self.fd[idx]
+        g1 = np.where(np.abs(g1) < 1e-15, 0., g1)
+        rt = self.rt[idx] + self.fd[idx] * self.h[idx] * x + self.h[idx] * self.integral(g0, g1, x)
+        positive = t > 0.
+        zero = np.where(positive, rt / np.where(positive, t, 1.), self.f[0])
+        return np.where(t > self.x[-1], self.y[-1], zero)
+
+INTERPOLATION_SCHEMES = {linearzero.scheme: linearzero,
+                         loglineardf.scheme: loglineardf,
+                         naturalcubic.scheme: naturalcubic,
+                         monotoneconvex.scheme: monotoneconvex}
+
+def create_interpolator(scheme, x, y):
+    '''
+    :param scheme: one of INTERPOLATION_SCHEMES keys, 'linear', 'loglinear', 'cubic', 'monotoneconvex'
+    :return: interpolation engine
+    '''
+    if scheme not in INTERPOLATION_SCHEMES:
+        raise ValueError(scheme, 'is not a supported interpolation scheme', list(INTERPOLATION_SCHEMES))
+    return INTERPOLATION_SCHEMES[scheme](x, y)
@@ -1,6 +1,5 @@
 import numpy as np
 import pandas as pd
-import math
 import CashFlow
 
 class XccySwap(object):
@@ -24,40 +23,7 @@ class XccySwap(object):
         self.is_MTM = is_MTM
     
     def leg1_cashflow(self):
-        tenor_unit = self.tenor[-1].upper()
-        tenor_length = int(self.tenor[0:-1])
-        freq_unit = self.leg1_freq[-1].upper()
-        if not freq_unit == 'M':
-            raise ValueError('leg frequency mut be defined in month unit')
-        freq_length = int(self.leg1_freq[0:-1])
-        start_dates = np.array([self.val_date])
-        end_dates = np.array([self.val_date])
-        if tenor_unit == 'Y':
-            periods = math.ceil(tenor_length * 12 / freq_length)
-            sub_period = tenor_length * 12 % freq_length
-        else:
-            periods = math.ceil(tenor_length / freq_length)
-            sub_period = tenor_length % freq_length
-        if sub_period != 0:
-            sub_dates = CashFlow.month_range_day(self.val_date, 2, str(sub_period) + 'm')
-            start_dates[0] = sub_dates[0]
-            end_dates[0] = sub_dates[1]
-            ## 1 stub period, 1 full period
-            if periods == 2:
-                start_dates = np.insert(start_dates, 1, sub_dates[1])
-                end_dates = np.insert(end_dates, 1, CashFlow.month_range_day(sub_dates[1], 2, self.leg1_freq)[-1])
-            ## multiple full periods
-            elif periods > 2:
-                start_dates = CashFlow.month_range_day(sub_dates[1], periods - 1, self.leg1_freq)
-                end_dates = CashFlow.month_range_day(start_dates[1], periods - 1, self.leg1_freq)
-                start_dates = np.insert(start_dates, 0, sub_dates[0])
-                end_dates = np.insert(end_dates, 0, sub_dates[1])
-        else:
-            start_dates = CashFlow.month_range_day(self.val_date, periods, self.leg1_freq)
-            if periods == 1:
-                end_dates[0] = CashFlow.month_range_day(start_dates[0], 2, self.leg1_freq)[-1]
-            else:
-                end_dates = CashFlow.month_range_day(start_dates[1], periods, self.leg1_freq)
+        start_dates, end_dates = CashFlow.generate_schedule(self.val_date, self.tenor, self.leg1_freq)
 
         cashflow_df = pd.DataFrame()
         cashflow_df['start dates'] = start_dates
@@ -79,40 +45,7 @@ class XccySwap(object):
         
         return cashflow_df
     def leg2_cashflow(self):
-        tenor_unit = self.tenor[-1].upper()
-        tenor_length = int(self.tenor[0:-1])
-        freq_unit = self.leg2_freq[-1].upper()
-        if not freq_unit == 'M':
-            raise ValueError('leg frequency mut be defined in month unit')
-        freq_length = int(self.leg2_freq[0:-1])
-        start_dates = np.array([self.val_date])
-        end_dates = np.array([self.val_date])
-        if tenor_unit == 'Y':
-            periods = math.ceil(tenor_length * 12 / freq_length)
-            sub_period = tenor_length * 12 % freq_length
-        else:
-            periods = math.ceil(tenor_length / freq_length)
-            sub_period = tenor_length % freq_length
-        if sub_period != 0:
-            sub_dates = CashFlow.month_range_day(self.val_date, 2, str(sub_period) + 'm')
-            start_dates[0] = sub_dates[0]
-            end_dates[0] = sub_dates[1]
-            ## 1 stub period, 1 full period
-            if periods == 2:
-                start_dates = np.insert(start_dates, 1, sub_dates[1])
-                end_dates = np.insert(end_dates, 1, CashFlow.month_range_day(sub_dates[1], 2, self.leg2_freq)[-1])
-            ## multiple full periods
-            elif periods > 2:
-                start_dates = CashFlow.month_range_day(sub_dates[1], periods - 1, self.leg2_freq)
-                end_dates = CashFlow.month_range_day(start_dates[1], periods - 1, self.leg2_freq)
-                start_dates = np.insert(start_dates, 0, sub_dates[0])
-                end_dates = np.insert(end_dates, 0, sub_dates[1])
-        else:
-            start_dates = CashFlow.month_range_day(self.val_date, periods, self.leg2_freq)
-            if periods == 1:
-                end_dates[0] = CashFlow.month_range_day(start_dates[0], 2, self.leg2_freq)[-1]
-            else:
-                end_dates = CashFlow.month_range_day(start_dates[1], periods, self.leg2_freq)
+        start_dates, end_dates = CashFlow.generate_schedule(self.val_date, self.tenor, self.leg2_freq)
 
         cashflow_df = pd.DataFrame()
         cashflow_df['start dates'] = start_dates
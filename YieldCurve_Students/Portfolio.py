@@ -0,0 +1,125 @@
+"""
+Name:   Swap portfolio pricer
+Description: batched valuation of vanilla and basis swaps sharing the same curves
+Created:     2026
+"""
+
+import numpy as np
+import Swap
+
+class swapportfolio(object):
+    '''
+    book of swaps packed into flat (ragged) cashflow arrays, one row per cashflow of every leg
+    Attributes
+    ==========
+    swaps : list<swap>
+    trade : numpy int, trade index of each cashflow
+    is_leg1 : numpy bool, cashflow belongs to leg1
+    start_yf, end_yf, accrual, notional, rate, margin : numpy double
+    is_float : numpy bool
+    curves : list<curve>, distinct curves used by the book
+    discount_groups : list<(curve, cashflow index)>, cashflows discounted on the same curve
+    forward_groups : list<(curve, cashflow index)>, float cashflows projected on the same curve
+
+    Methods
+    =======
+    pack() :
+        (re)build the arrays, call after assigning new curve objects to the swaps
+    compute_all() :
+        return dict of mtm, target rate, annuity, leg pvs numpy arrays, one entry per trade
+    compute_mtm() :
+        return mtm array, same as swap.compute_mtm per trade
+    compute_target_rate() :
+        return par rate (vanilla) or basis spread (basis swap) array, same as swap.compute_target_rate
+    compute_annuity() :
+        return annuity array, same as swap.compute_annuity
+    '''
+
+    def __init__(self, swaps):
+        for instrument in swaps:
+            if not isinstance(instrument, Swap.swap):
+                raise ValueError(type(instrument), 'is not supported in swap portfolio')
+        self.swaps = list(swaps)
+        self.pack()
+
+    def pack(self):
+        legs = []
+        for i, instrument in enumerate(self.swaps):
+            legs.append((i, True, instrument.leg1))
+            legs.append((i, False, instrument.leg2))
+        sizes = [leg.start_yf.shape[0] for i, is_leg1, leg in legs]
+        self.trade = np.repeat([i for i, is_leg1, leg in legs], sizes)
+        self.is_leg1 = np.repeat([is_leg1 for i, is_leg1, leg in legs], sizes)
+        self.is_float = np.repeat([leg.is_float for i, is_leg1, leg in legs], sizes)
+        self.start_yf = np.concatenate([leg.start_yf for i, is_leg1, leg in legs])
+        self.end_yf = np.concatenate([leg.end_yf for i, is_leg1, leg in legs])
+        self.accrual = np.concatenate([leg.accrual for i, is_leg1, leg in legs])
+        self.notional = np.concatenate([leg.notional for i, is_leg1, leg in legs])
+        self.rate = np.concatenate([leg.rate for i, is_leg1, leg in legs])
+        self.margin = np.concatenate([leg.margin for i, is_leg1, leg in legs])
+        self.is_basis_swap = np.array([instrument.is_basis_swap for instrument in self.swaps], dtype=bool)
+        if np.any(self.end_yf <= 0):
+            raise ValueError('cashflow payment date is before valuation date')
+        # group cashflows by curve object, one batched curve call per distinct curve
+        self.curves = []
+        curve_ids = {}
+        discount_id = []
+        forward_id = []
+        for i, is_leg1, leg in legs:
+            for curve, ids in ((leg.discount_curve, discount_id), (leg.forward_curve, forward_id)):
+                if curve is None or (ids is forward_id and not leg.is_float):
+                    ids.append(-1)
+                    continue
+                if id(curve) not in curve_ids:
+                    curve_ids[id(curve)] = len(self.curves)
+                    self.curves.append(curve)
+                ids.append(curve_ids[id(curve)])
+        discount_id = np.repeat(discount_id, sizes)
+        forward_id = np.repeat(forward_id, sizes)
+        if np.any(discount_id < 0):
+            raise ValueError('discount curve is not initialized for swap portfolio')
+        if np.any(self.is_float & (forward_id < 0)):
+            raise ValueError('forward curve is not initialized for float cashflow')
+        self.discount_groups = [(curve, np.flatnonzero(discount_id == k)) for k, curve in enumerate(self.curves)
+                                if np.any(discount_id == k)]
+        self.forward_groups = [(curve, np.flatnonzero(forward_id == k)) for k, curve in enumerate(self.curves)
+                               if np.any(forward_id == k)]
+
+    def compute_cashflow_columns(self):
+        '''
+        :return: df, coupon rate (forward for float cashflows) of every cashflow
+        '''
+        df = np.empty(self.end_yf.shape[0])
+        for curve, index in self.discount_groups:
+            df[index] = curve.get_discount_factor(self.end_yf[index])
+        rates = self.rate.copy()
+        for curve, index in self.forward_groups:
+            rates[index] = curve.get_forward_rate_yf(self.start_yf[index], self.end_yf[index])
+        return df, rates
+
+    def compute_all(self):
+        size = len(self.swaps)
+        df, rates = self.compute_cashflow_columns()
+        annuity_cf = self.notional * self.accrual * df
+        pv_ex_margin = annuity_cf * rates
+        pv = pv_ex_margin + annuity_cf * self.margin
+        leg1_pv = np.bincount(self.trade, np.where(self.is_leg1, pv, 0.), size)
+        leg1_pv_ex_margin = np.bincount(self.trade, np.where(self.is_leg1, pv_ex_margin, 0.), size)
+        leg2_pv = np.bincount(self.trade, np.where(self.is_leg1, 0., pv), size)
+        annuity = np.bincount(self.trade, np.where(self.is_leg1, annuity_cf, 0.), size)
+        target_rate = np.where(self.is_basis_swap, (leg2_pv - leg1_pv_ex_margin) / annuity, leg2_pv / annuity)
+        return {'mtm': leg1_pv - leg2_pv,
+                'target rate': target_rate,
+                'annuity': annuity,
+                'leg1 pv': leg1_pv,
+                'leg1 pv ex margin': leg1_pv_ex_margin,
+                'leg2 pv': leg2_pv}
+
+    def compute_mtm(self):
+        return self.compute_all()['mtm']
+
+    def compute_target_rate(self):
+        return self.compute_all()['target rate']
+
+    def compute_annuity(self):
+        return self.compute_all()['annuity']
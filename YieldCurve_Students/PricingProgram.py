@@ -0,0 +1,257 @@
+"""
+Name:   Pricing program
+Description: calibration instruments compiled into flat index/weight arrays, targets evaluated for all
+             instruments at once with grouped curve queries and segment sums
+Created:     2026
+"""
+
+import numpy as np
+import Swap
+import Future
+import FRA
+import FXForward
+
+class pricingprogram(object):
+    '''
+    compiled target rates of a list of instruments
+    every target is target_i = sum(numerator terms of i) / sum(denominator terms of i), denominator 1 if no terms
+    numerator term = weight * (rate + const) * df, rate is a forward or zero rate (or none), df at a point (or 1)
+    denominator term = weight * df, e.g. annuity
+    Attributes
+    ==========
+    curves : list<curve>, curves queried by the program
+    point_curve, point_t : numpy int/double, curve id and year frac of every df/zero rate query point
+    curve_points : list<numpy int>, query points of each curve
+    fwd_start, fwd_end, fwd_tau : numpy, forward rate queries as point indices
+    zero_point : numpy int, zero rate queries as point indices
+    num_row, num_weight, num_rate, num_const, num_point : numpy, numerator terms sorted by instrument
+    den_row, den_weight, den_point : numpy, denominator terms sorted by instrument
+
+    Methods
+    =======
+    evaluate() :
+        return target rate of every instrument, same as instrument.compute_target_rate
+    evaluate_jacobian(offsets, size) :
+        return targets and d targets / d y of curves in offsets, dict<curve, column offset>
+    '''
+
+    def __init__(self, instruments):
+        self.size = len(instruments)
+        self.curves = []
+        self.__curve_ids = {}
+        self.__point_curve = []
+        self.__point_t = []
+        self.__fwd = []
+        self.__zero = []
+        self.__num = []
+        self.__den = []
+        for row, instrument in enumerate(instruments):
+            if isinstance(instrument, Swap.swap):
+                self.__compile_swap(row, instrument)
+            elif isinstance(instrument, Future.future):
+                self.__compile_future(row, instrument)
+            elif isinstance(instrument, FRA.fra):
+                rate = self.__add_forward(instrument.forward_curve, np.array([instrument.start_yf]),
+                                          np.array([instrument.end_yf]))
+                self.__add_numerator(row, np.ones(1), rate, np.zeros(1), -np.ones(1, dtype=int))
+            elif isinstance(instrument, FXForward.fxforward):
+                t = np.array([instrument.maturity_yf])
+                self.__add_numerator(row, np.ones(1), self.__add_zero(instrument.dom_curve, t), np.zeros(1),
+                                     -np.ones(1, dtype=int))
+                self.__add_numerator(row, -np.ones(1), self.__add_zero(instrument.for_curve, t), np.zeros(1),
+                                     -np.ones(1, dtype=int))
+            else:
+                raise AttributeError(type(instrument), 'is not supported instrument type in pricing program')
+        self.__link()
+
+    def __curve_id(self, curve):
+        if curve is None:
+            raise ValueError('curve is not initialized for pricing program')
+        if id(curve) not in self.__curve_ids:
+            self.__curve_ids[id(curve)] = len(self.curves)
+            self.curves.append(curve)
+        return self.__curve_ids[id(curve)]
+
+    def __add_points(self, curve, t):
+        start = sum(len(points) for points in self.__point_t)
+        self.__point_curve.append(np.full(t.shape[0], self.__curve_id(curve)))
+        self.__point_t.append(np.asarray(t, dtype=float))
+        return start + np.arange(t.shape[0])
+
+    def __add_forward(self, curve, start_yf, end_yf):
+        if np.any(start_yf < 0) or np.any(end_yf <= start_yf):
+            raise ValueError('forward rate start date or end date is not valid')
+        start_points = self.__add_points(curve, start_yf)
+        end_points = self.__add_points(curve, end_yf)
+        first = sum(len(fwd[0]) for fwd in self.__fwd)
+        self.__fwd.append((start_points, end_points, end_yf - start_yf))
+        # forward rates are stored first, zero rates after, see __link
+        return ('fwd', first + np.arange(start_yf.shape[0]))
+
+    def __add_zero(self, curve, t):
+        points = self.__add_points(curve, t)
+        first = sum(len(zero) for zero in self.__zero)
+        self.__zero.append(points)
+        return ('zero', first + np.arange(t.shape[0]))
+
+    def __add_numerator(self, row, weight, rate, const, point):
+        self.__num.append((np.full(weight.shape[0], row), weight, rate, const, point))
+
+    def __add_denominator(self, row, weight, point):
+        self.__den.append((np.full(weight.shape[0], row), weight, point))
+
+    def __compile_leg(self, row, leg, sign, include_margin):
+        weight = sign * leg.notional * leg.accrual
+        point = self.__add_points(leg.discount_curve, leg.end_yf)
+        if leg.is_float:
+            rate = self.__add_forward(leg.forward_curve, leg.start_yf, leg.end_yf)
+            const = leg.margin if include_margin else np.zeros(leg.margin.shape[0])
+        else:
+            rate = ('none', -np.ones(leg.rate.shape[0], dtype=int))
+            const = leg.rate + leg.margin if include_margin else leg.rate
+        self.__add_numerator(row, weight, rate, const, point)
+
+    def __compile_swap(self, row, instrument):
+        if np.any(instrument.leg1.end_yf <= 0) or np.any(instrument.leg2.end_yf <= 0):
+            raise ValueError('cashflow payment date is before valuation date')
+        # vanilla: leg2 pv / annuity, basis: (leg2 pv - leg1 pv excluding margin) / annuity
+        self.__compile_leg(row, instrument.leg2, 1., True)
+        if instrument.is_basis_swap:
+            self.__compile_leg(row, instrument.leg1, -1., False)
+        leg1 = instrument.leg1
+        annuity_curve = instrument.leg1_discount_curve
+        self.__add_denominator(row, leg1.notional * leg1.accrual, self.__add_points(annuity_curve, leg1.end_yf))
+
+    def __compile_future(self, row, instrument):
+        if not instrument.is_fedfuture:
+            rate = self.__add_forward(instrument.forward_curve, np.array([instrument.start_day / 365.]),
+                                      np.array([instrument.end_day / 365.]))
+            self.__add_numerator(row, np.ones(1), rate, np.zeros(1), -np.ones(1, dtype=int))
+            return
+        # daily forwards averaged by number of days + 1, as future.compute_target_rate
+        days = np.arange(instrument.start_day, instrument.end_day)
+        rate = self.__add_forward(instrument.forward_curve, days / 365., (days + 1) / 365.)
+        self.__add_numerator(row, np.ones(days.shape[0]) / (days.shape[0] + 1), rate, np.zeros(days.shape[0]),
+                             -np.ones(days.shape[0], dtype=int))
+
+    def __link(self):
+        self.point_curve = np.concatenate(self.__point_curve) if self.__point_curve else np.zeros(0, dtype=int)
+        self.point_t = np.concatenate(self.__point_t) if self.__point_t else np.zeros(0)
+        self.curve_points = [np.flatnonzero(self.point_curve == k) for k in range(len(self.curves))]
+        self.fwd_start = np.concatenate([fwd[0] for fwd in self.__fwd]) if self.__fwd else np.zeros(0, dtype=int)
+        self.fwd_end = np.concatenate([fwd[1] for fwd in self.__fwd]) if self.__fwd else np.zeros(0, dtype=int)
+        self.fwd_tau = np.concatenate([fwd[2] for fwd in self.__fwd]) if self.__fwd else np.zeros(0)
+        self.zero_point = np.concatenate(self.__zero) if self.__zero else np.zeros(0, dtype=int)
+        fwd_size = self.fwd_start.shape[0]
+        rate_size = fwd_size + self.zero_point.shape[0]
+        rates = []
+        for terms in self.__num:
+            kind, index = terms[2]
+            # rate index into [forwards, zeros, 0.], rate_size points at the trailing 0
+            rates.append(index if kind == 'fwd' else index + fwd_size if kind == 'zero'
+                         else np.full(index.shape[0], rate_size))
+        self.num_row = np.concatenate([terms[0] for terms in self.__num])
+        self.num_weight = np.concatenate([terms[1] for terms in self.__num]).astype(float)
+        self.num_rate = np.concatenate(rates)
+        self.num_const = np.concatenate([terms[3] for terms in self.__num]).astype(float)
+        self.num_point = np.concatenate([terms[4] for terms in self.__num])
+        if self.__den:
+            self.den_row = np.concatenate([terms[0] for terms in self.__den])
+            self.den_weight = np.concatenate([terms[1] for terms in self.__den]).astype(float)
+            self.den_point = np.concatenate([terms[2] for terms in self.__den])
+        else:
+            self.den_row = np.zeros(0, dtype=int)
+            self.den_weight = np.zeros(0)
+            self.den_point = np.zeros(0, dtype=int)
+        # terms are appended instrument by instrument, segment starts for np.add.reduceat
+        self.num_rows, self.num_starts = np.unique(self.num_row, return_index=True)
+        self.den_rows, self.den_starts = np.unique(self.den_row, return_index=True)
+        self.__num = self.__den = self.__fwd = self.__zero = None
+        self.__point_curve = self.__point_t = None
+
+    def __evaluate_points(self):
+        zero = np.empty(self.point_t.shape[0])
+        for curve, points in zip(self.curves, self.curve_points):
+            zero[points] = curve.engine.zero_rate(self.point_t[points])
+        # df at every point, 1 appended for terms without discounting (point -1)
+        df = np.append(np.exp(-zero * self.point_t), 1.)
+        df_start = df[self.fwd_start]
+        df_end = df[self.fwd_end]
+        rates = np.concatenate([(df_start / df_end - 1) / self.fwd_tau, zero[self.zero_point], [0.]])
+        return zero, df, rates
+
+    def __segment_sums(self, num_values, den_values):
+        numerator = np.zeros(self.size)
+        numerator[self.num_rows] = np.add.reduceat(num_values, self.num_starts) if num_values.size else 0.
+        denominator = np.ones(self.size)
+        if den_values.size:
+            denominator[self.den_rows] = np.add.reduceat(den_values, self.den_starts)
+        return numerator, denominator
+
+    def evaluate(self):
+        zero, df, rates = self.__evaluate_points()
+        num_values = self.num_weight * (rates[self.num_rate] + self.num_const) * df[self.num_point]
+        den_values = self.den_weight * df[self.den_point]
+        numerator, denominator = self.__segment_sums(num_values, den_values)
+        return numerator / denominator
+
+    def evaluate_jacobian(self, offsets, size):
+        '''
+        :param offsets: dict<curve, column offset>, columns of curves not in offsets are dropped
+        :param size: number of columns
+        :return: targets, jacobian (instruments x size)
+        '''
+        zero, df, rates = self.__evaluate_points()
+        num_df = df[self.num_point]
+        num_values = self.num_weight * (rates[self.num_rate] + self.num_const) * num_df
+        den_values = self.den_weight * df[self.den_point]
+        numerator, denominator = self.__segment_sums(num_values, den_values)
+        targets = numerator / denominator
+        # reverse sweep, each row has its own adjoint, accumulate (row, point, d target / d zero) contributions
+        num_coef = 1. / denominator[self.num_row]
+        # d target / d rate = weight * df / denominator
+        rate_coef = self.num_weight * num_df * num_coef
+        # d target / d df, numerator weight * (rate + const) / denominator, denominator -weight * target / denominator
+        num_df_coef = self.num_weight * (rates[self.num_rate] + self.num_const) * num_coef
+        den_df_coef = -self.den_weight * (targets / denominator)[self.den_row]
+        contributions_row = []
+        contributions_point = []
+        contributions_coef = []
+        # df contributions of numerator and denominator terms, d df = -t df d zero
+        for rows, points, coef in ((self.num_row, self.num_point, num_df_coef),
+                                   (self.den_row, self.den_point, den_df_coef)):
+            mask = points >= 0
+            contributions_row.append(rows[mask])
+            contributions_point.append(points[mask])
+            contributions_coef.append(coef[mask] * -self.point_t[points[mask]] * df[points[mask]])
+        # forward rate contributions, fwd = (df_s / df_e - 1) / tau
+        is_fwd = self.num_rate < self.fwd_start.shape[0]
+        fwd_index = self.num_rate[is_fwd]
+        start = self.fwd_start[fwd_index]
+        end = self.fwd_end[fwd_index]
+        tau = self.fwd_tau[fwd_index]
+        coef = rate_coef[is_fwd]
+        start_coef = coef / (df[end] * tau)
+        end_coef = -coef * df[start] / (df[end] ** 2 * tau)
+        contributions_row += [self.num_row[is_fwd], self.num_row[is_fwd]]
+        contributions_point += [start, end]
+        contributions_coef += [start_coef * -self.point_t[start] * df[start],
+                               end_coef * -self.point_t[end] * df[end]]
+        # zero rate contributions, fx forwards
+        fwd_size = self.fwd_start.shape[0]
+        is_zero = (self.num_rate >= fwd_size) & (self.num_rate < rates.shape[0] - 1)
+        contributions_row.append(self.num_row[is_zero])
+        contributions_point.append(self.zero_point[self.num_rate[is_zero] - fwd_size])
+        contributions_coef.append(rate_coef[is_zero])
+        rows = np.concatenate(contributions_row)
+        points = np.concatenate(contributions_point)
+        coefs = np.concatenate(contributions_coef)
+        jacobian = np.zeros((self.size, size))
+        for k, curve in enumerate(self.curves):
+            if curve not in offsets:
+                continue
+            mask = self.point_curve[points] == k
+            index, weight = curve.get_node_weights(self.point_t[points[mask]])
+            np.add.at(jacobian, (np.broadcast_to(rows[mask][:, None], index.shape), offsets[curve] + index),
+                      coefs[mask][:, None] * weight)
+        return targets, jacobian
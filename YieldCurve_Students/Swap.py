@@ -7,10 +7,35 @@ Created:     2020
 
 import CashFlow
 import numpy as np
-import pandas as pd
-import math
 import pdb
 
+class swapvaluation(object):
+    '''
+    result record of swap.valuation
+    Attributes
+    ==========
+    mtm : double, leg1 pv - leg2 pv
+    target_rate : double, implied fixed rate, or implied leg1 margin for basis swap
+    annuity : double, sum of notional * accrual * df on leg1
+    leg1_pv, leg2_pv : double, leg pv including margin
+    leg1_pv_ex_margin, leg2_pv_ex_margin : double, leg pv excluding margin
+    pv01 : double, mtm change for 1bp on the leg1 fixed rate or margin
+    '''
+
+    def __init__(self, mtm, target_rate, annuity, leg1_pv, leg2_pv, leg1_pv_ex_margin, leg2_pv_ex_margin):
+        self.mtm = mtm
+        self.target_rate = target_rate
+        self.annuity = annuity
+        self.leg1_pv = leg1_pv
+        self.leg2_pv = leg2_pv
+        self.leg1_pv_ex_margin = leg1_pv_ex_margin
+        self.leg2_pv_ex_margin = leg2_pv_ex_margin
+        self.pv01 = annuity * 1e-4
+
+    def __repr__(self):
+        return ('swapvaluation(mtm=%r, target_rate=%r, annuity=%r, leg1_pv=%r, leg2_pv=%r, pv01=%r)'
+                % (self.mtm, self.target_rate, self.annuity, self.leg1_pv, self.leg2_pv, self.pv01))
+
 class swap(object):
     '''
     swap class
@@ -34,6 +59,14 @@ class swap(object):
         compute mtm of swap
     compute_target_rate():
         compute implied target rate
+    compute_mtm_sensitivity(), compute_target_rate_sensitivity():
+        return (value, gradient), gradient is dict curve -> d value / d curve.y, by adjoint
+    get_curves():
+        return distinct curves the swap is priced on
+    set_target_rate(target_rate):
+        reset the quoted fixed rate, or leg1 margin for basis swap
+    valuation():
+        return swapvaluation with mtm, target rate, annuity, leg pvs and pv01, each leg priced once
     __compute_annuity() :
         return sum of df*year_frac
     __init__(val_date, tenor, leg1_freq, leg2_freq, is_basis_swap, target_rate, notional,
@@ -64,46 +97,10 @@ class swap(object):
         self.leg2 = CashFlow.leg(True, val_date, leg2_cashflow_info, leg2_discount_curve, leg2_forward_curve)
 
     # private method to generate cashflowinfo
-    # return DataFrame
+    # return dict of numpy arrays, same columns as the leg cashflows info
     # leg_freq is in tenor format, in unit of month, e.g., '3M'
     def generate_cashflows(self, val_date, tenor, leg_freq, notional=1., target_rate=0.):
-        tenor_unit = tenor[-1].upper()
-        tenor_length = int(tenor[0:-1])
-        freq_unit = leg_freq[-1].upper()
-        if not freq_unit == 'M':
-            raise ValueError('leg frequency mut be defined in month unit')
-        freq_length = int(leg_freq[0:-1])
-
-        ## generate period start dates and end dates, incomplete period up front (stub period)
-        ## e.g., leg period freq 12m, trade tenor 18m, we have a stub period 6m, and a full period 12m
-        start_dates = np.array([val_date])
-        end_dates = np.array([val_date])
-        if tenor_unit == 'Y':
-            periods = math.ceil(tenor_length * 12 / freq_length)
-            sub_period = tenor_length * 12 % freq_length
-        else:
-            periods = math.ceil(tenor_length / freq_length)
-            sub_period = tenor_length % freq_length
-        if sub_period != 0:
-            sub_dates = CashFlow.month_range_day(val_date, 2, str(sub_period) + 'm')
-            start_dates[0] = sub_dates[0]
-            end_dates[0] = sub_dates[1]
-            ## 1 stub period, 1 full period
-            if periods == 2:
-                start_dates = np.insert(start_dates, 1, sub_dates[1])
-                end_dates = np.insert(end_dates, 1, CashFlow.month_range_day(sub_dates[1], 2, leg_freq)[-1])
-            ## multiple full periods
-            elif periods > 2:
-                start_dates = CashFlow.month_range_day(sub_dates[1], periods - 1, leg_freq)
-                end_dates = CashFlow.month_range_day(start_dates[1], periods - 1, leg_freq)
-                start_dates = np.insert(start_dates, 0, sub_dates[0])
-                end_dates = np.insert(end_dates, 0, sub_dates[1])
-        else:
-            start_dates = CashFlow.month_range_day(val_date, periods, leg_freq)
-            if periods == 1:
-                end_dates[0] = CashFlow.month_range_day(start_dates[0], 2, leg_freq)[-1]
-            else:
-                end_dates = CashFlow.month_range_day(start_dates[1], periods, leg_freq)
+        start_dates, end_dates = CashFlow.generate_schedule(val_date, tenor, leg_freq)
         cashflow_size = start_dates.shape[0]
         notionals = notional * np.ones(cashflow_size)
         margins = np.zeros(cashflow_size)
@@ -112,49 +109,74 @@ class swap(object):
             margins = target_rate * np.ones(cashflow_size)
         else:
             rates = target_rate * np.ones(cashflow_size)
-        columns = ['start date', 'end date', 'notional', 'fixed rate', 'margin']
-        cashflow_info = pd.DataFrame(columns=columns)
-        cashflow_info['start date'] = start_dates
-        cashflow_info['end date'] = end_dates
-        cashflow_info['notional'] = notionals
-        cashflow_info['fixed rate'] = rates
-        cashflow_info['margin'] = margins
+        cashflow_info = {'start date': start_dates,
+                         'end date': end_dates,
+                         'notional': notionals,
+                         'fixed rate': rates,
+                         'margin': margins}
         return cashflow_info
 
     def compute_mtm(self):
-        pv = self.leg1.compute_leg_pv()
-        pv -= self.leg2.compute_leg_pv()
-        return pv
+        return self.valuation().mtm
 
     def compute_annuity(self):
-        annuity = 0.
-        cashflows = self.leg1.cashflows
-        for cf in cashflows:
-            year_frac = (cf.end_date - cf.start_date).days / 365.
-            payment_date = (cf.end_date - self.val_date).days / 365.
-            annuity += year_frac * self.leg1_discount_curve.get_discount_factor(payment_date) * cf.notional
-        return annuity
+        return self.leg1.compute_annuity(self.leg1_discount_curve)
 
     def update_cashflow_curves(self):
-        for cf in self.leg1.cashflows:
-            cf.discount_curve = self.leg1_discount_curve
-            cf.forward_curve = self.leg1_forward_curve
-        for cf in self.leg2.cashflows:
-            cf.discount_curve = self.leg2_discount_curve
-            cf.forward_curve = self.leg2_forward_curve
+        self.leg1.set_curves(self.leg1_discount_curve, self.leg1_forward_curve)
+        self.leg2.set_curves(self.leg2_discount_curve, self.leg2_forward_curve)
 
     # if it is fixed float swap, target is swap rate
     # if it is basis swap, target is the basis spread on leg1
     def compute_target_rate(self):
+        return self.valuation().target_rate
+
+    def valuation(self):
+        leg1_pv, leg1_pv_ex_margin, annuity = self.leg1.compute_leg_components(self.leg1_discount_curve)
+        leg2_pv, leg2_pv_ex_margin, _ = self.leg2.compute_leg_components()
         if not self.is_basis_swap:
-            return self.leg2.compute_leg_pv() / self.compute_annuity()
+            target_rate = leg2_pv / annuity
+        else:
+            target_rate = (leg2_pv - leg1_pv_ex_margin) / annuity
+        return swapvaluation(leg1_pv - leg2_pv, target_rate, annuity, leg1_pv, leg2_pv,
+                             leg1_pv_ex_margin, leg2_pv_ex_margin)
+
+    def compute_mtm_sensitivity(self, gradient=None):
+        leg1_pv, gradient = self.leg1.compute_leg_pv_sensitivity(True, gradient, 1.)
+        leg2_pv, gradient = self.leg2.compute_leg_pv_sensitivity(True, gradient, -1.)
+        return leg1_pv - leg2_pv, gradient
+
+    def compute_target_rate_sensitivity(self, gradient=None):
+        # forward sweep, then propagate target_bar = 1 back to leg pvs and annuity
+        value = self.valuation()
+        annuity_bar = -value.target_rate / value.annuity
+        leg2_pv, gradient = self.leg2.compute_leg_pv_sensitivity(True, gradient, 1. / value.annuity)
+        if self.is_basis_swap:
+            leg1_pv, gradient = self.leg1.compute_leg_pv_sensitivity(False, gradient, -1. / value.annuity)
+        annuity, gradient = self.leg1.compute_annuity_sensitivity(self.leg1_discount_curve, gradient, annuity_bar)
+        return value.target_rate, gradient
+
+    def set_target_rate(self, target_rate):
+        self.target_rate = target_rate
+        if self.is_basis_swap:
+            self.leg1.set_rates(self.leg1.rate, target_rate)
         else:
-            exclude_margin_pv = self.leg1.compute_leg_pv(False)
-            return (self.leg2.compute_leg_pv() - exclude_margin_pv) / self.compute_annuity()
+            self.leg1.set_rates(target_rate, self.leg1.margin)
+
+    def get_curves(self):
+        curves = [self.leg1.discount_curve, self.leg2.discount_curve, self.leg1_discount_curve]
+        if self.leg1.is_float:
+            curves.append(self.leg1.forward_curve)
+        if self.leg2.is_float:
+            curves.append(self.leg2.forward_curve)
+        unique = []
+        for curve in curves:
+            if curve is not None and all(curve is not c for c in unique):
+                unique.append(curve)
+        return unique
 
     def get_maturity(self):
-        end_date = self.leg1.cashflows[-1].end_date
-        return (end_date - self.val_date).days / 365
+        return self.leg1.end_yf[-1]
 
 
 
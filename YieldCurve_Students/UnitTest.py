@@ -7,29 +7,70 @@ Created:     2020
 # %%
 import pandas as pd
 import Curve
+import CashFlow
+import Interpolation
 import Swap
+import Portfolio
+import PricingProgram
 import Future
 import FRA
 import FXForward
+import Calibration
+import CurveCube
 import MTMXccySwap as MTMXccySwap
 import numpy as np
 import datetime as dt
+import os
+import tempfile
 from dateutil.relativedelta import relativedelta
 
 def test_curve(val_date):
     name = 'test_curve'
     x = np.arange(0, 10)
     y = np.array([0.005 for xx in range(1, 11)])
-    test_curve = Curve.curve(name, val_date, x, y)
+    test_curve = Curve.curve(name, val_date, x, y, cache_size=16)
     fwd_date_start = val_date + relativedelta(years=+5)
     fwd_date_end = val_date + relativedelta(years=+6)
     fwd_rate = test_curve.get_forward_rate(fwd_date_start, fwd_date_end)
     print('extrapolation at 15Y', test_curve.get_discount_factor(15), fwd_rate)
+    test_curve.get_forward_rate(fwd_date_start, fwd_date_end)
+    print('memo cache after repeated forward', test_curve.get_cache_stats())
+    print('0-d array queries', test_curve.get_discount_factor(np.array(2.)),
+          test_curve.get_forward_rate_yf(np.array(1.), np.array(2.)))
+    print('vectorized discount factors', test_curve.get_discount_factor(np.array([0.5, 5., 15.])))
+    fwd_dates_start = [val_date + relativedelta(years=+i) for i in range(1, 6)]
+    fwd_dates_end = [val_date + relativedelta(years=+i + 1) for i in range(1, 6)]
+    print('vectorized forward rates', test_curve.get_forward_rate(fwd_dates_start, fwd_dates_end))
+    df, index, weight = test_curve.get_discount_factor(np.array([2.5, 15.]), return_sensitivity=True)
+    print('discount factor node sensitivity', df, index, weight)
     y_update = np.array([0.007 for xx in range(1, 11)])
     test_curve.update(y_update)
     fwd_rate = test_curve.get_forward_rate(fwd_date_start, fwd_date_end)
     print('extrapolation at 15Y', test_curve.get_discount_factor(15), fwd_rate)
 
+def test_interpolation(val_date):
+    x = np.array([0.25, 0.5, 1., 2., 5., 10.])
+    y = np.array([0.010, 0.012, 0.015, 0.018, 0.020, 0.021])
+    for scheme in Interpolation.INTERPOLATION_SCHEMES:
+        test_curve = Curve.curve('test_curve', val_date, x, y, interp_scheme=scheme)
+        print(scheme, 'zero rates at pillars', test_curve.interp(x))
+        print(scheme, 'discount factors', test_curve.get_discount_factor(np.array([0.1, 0.75, 3., 7., 15.])))
+        index, weight = test_curve.engine.node_weights(np.array([0.75, 3.]))
+        print(scheme, 'node weights at 0.75Y and 3Y', index, weight)
+        print(scheme, 'nodes moving values up to 3Y', test_curve.get_node_support(3.))
+    try:
+        Curve.curve('test_curve', val_date, np.array([0.5, 1., 1., 2.]), np.array([0.010, 0.015, 0.015, 0.018]))
+    except ValueError as e:
+        print('duplicate pillars rejected', e)
+
+def test_schedule(val_date):
+    start_dates, end_dates = CashFlow.generate_schedule(val_date, '18M', '12M')
+    print('18M schedule with 12M frequency, front stub', start_dates, end_dates)
+    month_end = dt.datetime(2020, 1, 31)
+    start_dates, end_dates = CashFlow.generate_schedule(month_end, '1Y', '3M')
+    print('1Y quarterly schedule from month end', start_dates, end_dates)
+    print('memoized schedule is shared', CashFlow.generate_schedule(month_end, '1Y', '3M')[0] is start_dates)
+
 def test_swap(val_date):
     x = np.arange(1, 11)
     y = 0.02 * np.ones(10)
@@ -43,15 +84,22 @@ def test_swap(val_date):
                              leg1_discount_curve, leg1_forward_curve, leg2_discount_curve, leg2_forward_curve)
     print('5Y fixed float vanilla swap mtm is:', str(vanilla_swap.compute_mtm()))
     print('5Y implied fixed rate is:', str(vanilla_swap.compute_target_rate()))
+    print('5Y float leg pv, columnar vs cashflow view:', vanilla_swap.leg2.compute_leg_pv(),
+          sum([cf.compute_cashflow_pv() for cf in vanilla_swap.leg2.cashflows]))
     y_update = 0.05 * np.ones(10)
     leg2_forward_curve.update(y_update)
     print('Updated 5Y implied fixed rate is:', str(vanilla_swap.compute_target_rate()))
+    print('5Y swap leg pv stats, fixed leg reused after forward curve update:',
+          vanilla_swap.leg1.get_pv_stats(), vanilla_swap.leg2.get_pv_stats())
     # test basis swap
     # leg1 discount/forecast by the same curve, leg2 different curves
     basis_swap = Swap.swap(val_date, '5Y', '3M', '3M', True, 0.01, 1000000,
                              leg1_discount_curve, leg1_discount_curve, leg2_discount_curve, leg2_forward_curve)
     print('5Y basis swap mtm is:', str(basis_swap.compute_mtm()))
     print('5Y implied basis swap margin is:', str(basis_swap.compute_target_rate()))
+    print('5Y basis swap valuation is:', basis_swap.valuation())
+    mtm, gradient = basis_swap.compute_mtm_sensitivity()
+    print('5Y basis swap mtm sensitivity to forward curve nodes:', gradient[leg2_forward_curve])
     # test stub period, 9M swap
     vanilla_swap2 = Swap.swap(val_date, '9M', '12M', '3M', False, 0.04, 1000000,
                              leg1_discount_curve, leg1_forward_curve, leg2_discount_curve, leg2_forward_curve)
@@ -62,6 +110,44 @@ def test_swap(val_date):
     print('18M fixed float vanilla swap mtm is:', str(vanilla_swap3.compute_mtm()))
     print('18M implied fixed rate is:', str(vanilla_swap3.compute_target_rate()))
 
+def test_portfolio(val_date):
+    x = np.arange(1, 11)
+    discount_curve = Curve.curve("dis_curve1", val_date, x, 0.02 * np.ones(10))
+    forward_curve = Curve.curve("fwd_curve1", val_date, x, 0.03 * np.ones(10))
+    swaps = [Swap.swap(val_date, tenor, '6M', '3M', False, 0.04, 1000000,
+                       discount_curve, forward_curve, discount_curve, forward_curve)
+             for tenor in ['9M', '18M', '2Y', '5Y', '10Y']]
+    swaps.append(Swap.swap(val_date, '5Y', '3M', '3M', True, 0.01, 1000000,
+                           discount_curve, discount_curve, discount_curve, forward_curve))
+    book = Portfolio.swapportfolio(swaps)
+    result = book.compute_all()
+    print('portfolio mtm is:', result['mtm'])
+    print('portfolio mtm max diff vs per trade:',
+          np.max(np.abs(result['mtm'] - [s.compute_mtm() for s in swaps])))
+    print('portfolio target rate max diff vs per trade:',
+          np.max(np.abs(result['target rate'] - [s.compute_target_rate() for s in swaps])))
+
+def test_pricing_program(val_date):
+    x = np.arange(1, 11)
+    discount_curve = Curve.curve("dis_curve1", val_date, x, 0.02 + 0.001 * np.sqrt(x))
+    forward_curve = Curve.curve("fwd_curve1", val_date, x, 0.03 + 0.001 * np.sqrt(x))
+    instruments = [Future.future(val_date, '6M', '3M', False, 98., 1., discount_curve, forward_curve),
+                   Future.future(val_date, '9M', '1M', True, 98., 1., discount_curve, forward_curve),
+                   FRA.fra(val_date, '6M', '3M', 0.03, 1., discount_curve, forward_curve),
+                   FXForward.fxforward(val_date, '9m', 108, 107.1923, discount_curve, forward_curve),
+                   Swap.swap(val_date, '5Y', '6M', '3M', False, 0.04, 1., discount_curve, forward_curve,
+                             discount_curve, forward_curve),
+                   Swap.swap(val_date, '5Y', '3M', '3M', True, 0.01, 1., discount_curve, discount_curve,
+                             discount_curve, forward_curve)]
+    program = PricingProgram.pricingprogram(instruments)
+    targets, jacobian = program.evaluate_jacobian({discount_curve: 0, forward_curve: 10}, 20)
+    print('pricing program target max diff vs per instrument:',
+          np.max(np.abs(program.evaluate() - [i.compute_target_rate() for i in instruments])))
+    gradients = [i.compute_target_rate_sensitivity()[1] for i in instruments]
+    expected = np.array([np.concatenate([g.get(discount_curve, np.zeros(10)), g.get(forward_curve, np.zeros(10))])
+                         for g in gradients])
+    print('pricing program jacobian max diff vs adjoint:', np.max(np.abs(jacobian - expected)))
+
 def test_future(val_date):
     x = np.arange(1, 11)
     y = 0.02 * np.ones(10)
@@ -81,6 +167,8 @@ def test_fra(val_date):
     forward_curve = Curve.curve("fwd_curve1", val_date, x, y)
     fra = FRA.fra(val_date, '6M', '3M', 0.03, 1000000, discount_curve, forward_curve)
     print('6m-3m implied FRA rate', fra.compute_target_rate())
+    rate, gradient = fra.compute_target_rate_sensitivity()
+    print('6m-3m FRA rate sensitivity to forward curve nodes', gradient[forward_curve])
 
 def test_fxforward(val_date):
     x = np.arange(1, 11)
@@ -179,6 +267,108 @@ def test_mtmxccyswap_readcurve(val_date):
     print('5Y mtm xccy swap mtm is:', str(basis_swap.compute_mtm()))
     print('5Y mtm xccy implied margin is:', str(basis_swap.compute_target_rate()))
  
+def test_calibration_report(val_date):
+    for method in ('levmar', 'trf'):
+        for use_jacobian in (True, False):
+            curves_info_dict = {}
+            Calibration.read_curves_info('USD_calibration.csv', curves_info_dict)
+            curves_to_calibrate = {'USD.OIS': pd.DataFrame(), 'USD.LIBOR.3M': pd.DataFrame()}
+            curve_constructor, report = Calibration.solve_curves(val_date, curves_info_dict, curves_to_calibrate, {},
+                                                                 use_jacobian=use_jacobian, method=method,
+                                                                 verbose=False)
+            print(method, 'analytic jacobian' if use_jacobian else 'finite difference', 'nfev', report.nfev,
+                  'iteration norms', report.iteration_norms)
+
+def test_curve_store(val_date):
+    input_curve_names = ['USD.OIS', 'USD.LIBOR.3M']
+    input_curves_dict = {}
+    Calibration.read_input_curves(val_date, 'USDOISLIBOR3M_result.csv', input_curve_names, input_curves_dict)
+    stored_curves_dict = {}
+    with tempfile.TemporaryDirectory() as store_dir:
+        store_pathname = os.path.join(store_dir, 'USDOISLIBOR3M_result.npz')
+        Calibration.save_curve_store(input_curves_dict, store_pathname)
+        Calibration.read_input_curves(val_date, store_pathname, input_curve_names, stored_curves_dict)
+        try:
+            Calibration.read_input_curves(val_date + dt.timedelta(days=1), store_pathname, input_curve_names, {})
+        except ValueError as e:
+            print('curve store read on another val date rejected', e)
+    for name in input_curve_names:
+        print(name, 'curve store zero rate max diff vs csv:',
+              np.max(np.abs(stored_curves_dict[name].y - input_curves_dict[name].y)))
+
+def test_recalibrate(val_date):
+    curves_info_dict = {}
+    Calibration.read_curves_info('JPY_calibration.csv', curves_info_dict)
+    curves_to_calibrate = {'JPY.TONAR': pd.DataFrame(), 'JPY.LIBOR.3M': pd.DataFrame(), 'JPY.LIBOR.6M': pd.DataFrame()}
+    curve_constructor, report = Calibration.solve_curves(val_date, curves_info_dict, curves_to_calibrate, {})
+    market_quote = curves_info_dict['JPY.LIBOR.6M']['Market Quote'].iloc[5]
+    report = curve_constructor.recalibrate({('JPY.LIBOR.6M', 5): market_quote + 1e-4})
+    print('recalibrated curves after JPY.LIBOR.6M quote change', report.curve_names,
+          'max abs residual', report.max_abs_residual)
+    print('caller market quote unchanged', curves_info_dict['JPY.LIBOR.6M']['Market Quote'].iloc[5] == market_quote)
+
+def test_calibrate_history(val_date):
+    curves_info_dict = {}
+    Calibration.read_curves_info('USD_calibration.csv', curves_info_dict)
+    val_dates = [val_date + dt.timedelta(days=i) for i in range(3)]
+    market_quotes = curves_info_dict['USD.LIBOR.6M']['Market Quote'].values
+    # 6m quotes shifted by 1bp a day, ois and 3m curves read from the store of the first run
+    quote_history = {'USD.LIBOR.6M': pd.DataFrame([market_quotes + 1e-4 * i for i in range(3)], index=val_dates)}
+    with tempfile.TemporaryDirectory() as store_dir:
+        Calibration.calibrate_history(val_dates, curves_info_dict, {}, ['USD.OIS', 'USD.LIBOR.3M'], store_dir)
+        Calibration.calibrate_history(val_dates, curves_info_dict, quote_history, ['USD.LIBOR.6M'], store_dir,
+                                      store_dir, ['USD.OIS', 'USD.LIBOR.3M'])
+        dates, x, y, interp_scheme = CurveCube.read_curve_history(store_dir, 'USD.LIBOR.6M')
+        # copies, the memory mapped rows are released before the store is removed
+        dates, y = np.array(dates), np.array(y)
+    print('curve cube store USD.LIBOR.6M dates', dates, 'last pillar zero rates', y[:, -1])
+
+def test_curve_cube_store(val_date):
+    x = np.array([0.5, 1., 2., 5.])
+    curves = [Curve.curve('USD.OIS', val_date + dt.timedelta(days=i), x, 0.01 + 0.001 * i + 0.001 * x)
+              for i in range(3)]
+    with tempfile.TemporaryDirectory() as store_dir:
+        CurveCube.append_curves(store_dir, {'USD.OIS': curves[0]})
+        # append of the second date interrupted after the x row, before the y row and the date
+        with open(CurveCube.curve_file_pathname(store_dir, 'USD.OIS', CurveCube.X_SUFFIX), 'ab') as f:
+            f.write(np.asarray(curves[1].x, dtype=np.float64).tobytes())
+        CurveCube.append_curves(store_dir, {'USD.OIS': curves[2]})
+        dates, x_stored, y_stored, interp_scheme = CurveCube.read_curve_history(store_dir, 'USD.OIS')
+        dates, y_stored = np.array(dates), np.array(y_stored)
+    print('curve cube store after partial append, dates', dates, 'last row matches the last curve',
+          np.array_equal(y_stored[-1], curves[2].y))
+
+def test_curve_cube(val_date):
+    dates = np.datetime64(val_date, 'D') + np.arange(5)
+    x = np.arange(1, 11) * np.ones((5, 1)) - np.arange(5)[:, None] / 365.
+    y = 0.02 + 0.001 * np.sqrt(x) + 0.0001 * np.arange(5)[:, None]
+    t = np.array([0.25, 0.5, 1., 2.5, 7., 12.])
+    for interp_scheme in ['linear', 'loglinear', 'cubic', 'monotoneconvex']:
+        cube = CurveCube.curvecube('USD.OIS', dates, x, y, interp_scheme)
+        df = cube.get_discount_factor(t)
+        fwd = cube.get_forward_rate_yf(t[:-1], t[1:])
+        print(interp_scheme, 'curve cube df max diff vs curve:',
+              max(np.max(np.abs(df[i] - cube.get_curve(i).get_discount_factor(t))) for i in range(5)),
+              'forward max diff vs curve:',
+              max(np.max(np.abs(fwd[i] - cube.get_curve(i).get_forward_rate_yf(t[:-1], t[1:]))) for i in range(5)))
+
+def test_calibrate_curve_dag(val_date):
+    dag_curves = Calibration.calibrate_curve_dag(val_date, ['USD_calibration.csv', 'JPY_calibration.csv'])
+    # serial chain, parents calibrated first and passed in memory
+    serial_curves = {}
+    for input_file_pathname, calibration_sets in (('USD_calibration.csv', [['USD.OIS', 'USD.LIBOR.3M'], ['USD.LIBOR.6M']]),
+                                                  ('JPY_calibration.csv', [['JPY.TONAR', 'JPY.LIBOR.3M', 'JPY.LIBOR.6M']])):
+        curves_info_dict = {}
+        Calibration.read_curves_info(input_file_pathname, curves_info_dict)
+        for curve_names in calibration_sets:
+            curves_to_calibrate = dict((name, pd.DataFrame()) for name in curve_names)
+            curve_constructor, report = Calibration.solve_curves(val_date, curves_info_dict, curves_to_calibrate,
+                                                                 dict(serial_curves), verbose=False)
+            serial_curves.update(curve_constructor.curves_to_calibrate)
+    print('dag calibrated curves', sorted(dag_curves.keys()))
+    for name, curve in serial_curves.items():
+        print(name, 'dag zero rate max diff vs serial chain:', np.max(np.abs(dag_curves[name].y - curve.y)))
+
 if __name__ == '__main__':
     val_date = dt.datetime(2020, 1, 2)
     # test_curve(val_date)